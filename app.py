@@ -2,11 +2,15 @@
 import pandas as pd
 from pathlib import Path
 import streamlit as st
+from streamlit.components.v1 import html as components_html
 from auth import get_gspread_client
-from sheet_io import read_sheet_values
-from map_builder import make_map
-from forms import render_input_form
+from sheet_io import fetch_raw_values
+from map_builder import make_map_html
+from forms import render_input_form, pending_row_count, with_pending_rows
 import hashlib
+import re
+import weakref
+from typing import Dict, Tuple
 from PIL import Image
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -23,60 +27,199 @@ st.set_page_config(
 
 # ----------------- CSS -----------------
 css_path = Path(__file__).resolve().parent / "styles.css"
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,])\s*")
+
+@st.cache_resource
+def _load_css(path: Path) -> str:
+    """Baca & minify styles.css sekali per proses (app.py sendiri dieksekusi ulang setiap rerun)"""
+    css = _CSS_COMMENT_RE.sub("", path.read_text(encoding="utf-8"))
+    css = _CSS_SPACE_RE.sub(" ", css)
+    return _CSS_PUNCT_RE.sub(r"\1", css).strip()
+
 try:
-    css = css_path.read_text(encoding="utf-8")
+    css = _load_css(css_path)
     st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 except FileNotFoundError:
     st.warning("styles.css tidak ditemukan - pastikan berada di folder yang sama dengan app.py.")
 
+# Legenda statis untuk kolom peta (tidak bergantung pada data)
+_LEGEND_HTML = """
+<div style="font-family:Arial,sans-serif;">
+<b>Level Resiko (warna isi)</b><br>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:16px;height:12px;background:#3d3d3d;border-radius:3px"></div> Lower
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:16px;height:12px;background:#7db86a;border-radius:3px"></div> Low
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:16px;height:12px;background:#f2e804;border-radius:3px"></div> Medium
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:16px;height:12px;background:#ffaa00;border-radius:3px"></div> High
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:16px;height:12px;background:#b10202;border-radius:3px"></div> Emergency
+</div>
+
+<hr />
+
+<b>Indikator Surat (bentuk)</b><br>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <svg width="16" height="16"><circle cx="8" cy="8" r="6" fill="#444"/></svg> Selesai Surat (lingkaran)
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <svg width="16" height="16" viewBox="0 0 16 16"><polygon points="3,3 13,3 13,13 3,13" fill="#444"/></svg> Surat Himbauan (persegi)
+</div>
+
+<hr />
+<b>Indikator Bungkus (warna border)</b><br>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:22px;height:14px;background:#fff;border:3px solid #ff6b35"></div> Pengiriman Usulan
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:22px;height:14px;background:#fff;border:3px solid #28a745"></div> Realisasi Pembungkusan
+</div>
+<div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
+  <div style="width:22px;height:14px;background:#fff;border:3px solid #dc3545"></div> Belum Ada Tindak Lanjut
+</div>
+</div>
+"""
+
 # --- Helper: normalisasi tipe & tampilan (tidak ubah Sheets) ---
 FORCE_STRING_COLS = ["Nomer Surat Permohonan Pembungkusan"]
+STRING_DTYPE = "string[pyarrow]"
+# kolom dengan sedikit nilai unik -> disimpan sebagai category
+CATEGORY_COLS = ["Penyulang", "Level Resiko", "Color", "Beban"]
 
 def _normalize_df(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    """Normalisasi tipe kolom. Frame input diubah langsung (tidak di-copy)."""
+    # Latitude & Longitude diparse dalam satu pass (digabung jadi satu Series panjang)
+    coord_cols = [c for c in ("Latitude", "Longitude") if c in df.columns]
+    if coord_cols:
+        n = len(df)
+        stacked = pd.concat([df[c] for c in coord_cols], ignore_index=True)
+        # sheet dibaca UNFORMATTED_VALUE -> koordinat umumnya sudah berupa angka
+        parsed = pd.to_numeric(stacked, errors="coerce")
+        if not pd.api.types.is_numeric_dtype(stacked):
+            # sisa teks dengan koma desimal (mis. "-7,93") saja yang di-replace
+            retry = parsed.isna() & stacked.notna()
+            if retry.any():
+                parsed[retry] = pd.to_numeric(
+                    stacked[retry].astype(str).str.replace(",", ".", regex=False), errors="coerce"
+                )
+        # tetap float64: float32 hanya ~7 digit signifikan, popup & preview jadi menampilkan noise
+        parsed = parsed.astype("float64").to_numpy()
+        for i, c in enumerate(coord_cols):
+            df[c] = parsed[i * n:(i + 1) * n]
+    # string berbasis Arrow: satu buffer per kolom, operasi .str jalan di kernel Arrow
     obj_cols = df.select_dtypes(include=["object"]).columns.tolist()
     if obj_cols:
-        df[obj_cols] = df[obj_cols].astype("string")
-    for c in FORCE_STRING_COLS:
-        if c in df.columns:
-            df[c] = df[c].astype("string").str.strip()
-    for c in ["Latitude", "Longitude"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(
-                df[c].astype("string").str.replace(",", ".", regex=False),
-                errors="coerce"
-            )
+        df[obj_cols] = df[obj_cols].astype(STRING_DTYPE)
+    str_cols = df.columns.intersection(FORCE_STRING_COLS)
+    if len(str_cols):
+        df[str_cols] = df[str_cols].astype(STRING_DTYPE).apply(lambda s: s.str.strip())
+    cat_cols = df.columns.intersection(CATEGORY_COLS)
+    if len(cat_cols):
+        df[cat_cols] = df[cat_cols].astype("category")
     return df
 
 def _pretty_df(df: pd.DataFrame) -> pd.DataFrame:
-    pretty = df.copy()
-    for c in FORCE_STRING_COLS:
-        if c in pretty.columns:
-            pretty[c] = pretty[c].replace({"0": "", 0: ""})
+    cols = df.columns.intersection(FORCE_STRING_COLS)
+    if not len(cols):
+        return df
+    # shallow copy: kolom lain tetap berbagi buffer dengan df session
+    pretty = df.copy(deep=False)
+    # satu perbandingan vektor; kolom ini sudah bertipe string setelah _normalize_df
+    sub = df[cols].astype(STRING_DTYPE)
+    pretty[cols] = sub.mask(sub.eq("0").fillna(False), "")
     return pretty
 
+@st.cache_resource
+def _hash_memo() -> Dict[int, Tuple["weakref.ref[pd.DataFrame]", str]]:
+    """id(df) -> (weakref ke df, digest); bertahan antar rerun supaya frame yang sama tidak di-hash ulang"""
+    return {}
+
+def _remember_hash(df: pd.DataFrame, digest: str) -> None:
+    memo = _hash_memo()
+    key = id(df)
+    memo[key] = (weakref.ref(df, lambda _, k=key: memo.pop(k, None)), digest)
+
 def _get_data_hash(df: pd.DataFrame) -> str:
-    """Generate hash dari DataFrame untuk deteksi perubahan data"""
+    """Generate hash dari DataFrame untuk deteksi perubahan data (seluruh sel ikut di-hash)"""
     if df.empty:
         return "empty"
-    # Buat string representasi dari data penting
-    data_str = str(df.shape) + str(df.columns.tolist())
-    if not df.empty:
-        data_str += str(df.iloc[0].tolist() if len(df) > 0 else "")
-        data_str += str(df.iloc[-1].tolist() if len(df) > 0 else "")
-    return hashlib.md5(data_str.encode()).hexdigest()
-
-@st.cache_data(ttl=300)  # Cache selama 5 menit
+    memo = _hash_memo().get(id(df))
+    if memo is not None and memo[0]() is df:
+        return memo[1]
+
+    h = hashlib.blake2b(digest_size=8)
+    h.update(b"%dx%d" % df.shape)
+    h.update("\x1f".join(map(str, df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest = h.hexdigest()
+
+    _remember_hash(df, digest)
+    return digest
+
+@st.cache_data(max_entries=4)
+def _normalize_cached(raw_digest: str, _values) -> Tuple[pd.DataFrame, str]:
+    """Normalisasi (dan hash data) hanya diulang jika isi sheet (raw_digest) berubah"""
+    if not _values:
+        df = _normalize_df(pd.DataFrame())
+    else:
+        df = _normalize_df(pd.DataFrame(_values[1:], columns=_values[0]))
+    return df, _get_data_hash(df)
+
 def load_sheets_data():
     """Load data dari Google Sheets dengan caching"""
     try:
-        gc = get_gspread_client()
-        df_raw = read_sheet_values(gc)
-        df_normalized = _normalize_df(df_raw)
+        # nilai mentah di-cache (TTL) di sheet_io.fetch_raw_values; dibersihkan setelah append_rows
+        raw_digest, values = fetch_raw_values(get_gspread_client())
+        df_normalized, data_hash = _normalize_cached(raw_digest, values)
+        # cache_data mengembalikan salinan baru; daftarkan hash-nya agar tidak dihitung ulang
+        _remember_hash(df_normalized, data_hash)
         return df_normalized, None
     except Exception as e:
         return None, str(e)
 
+@st.fragment
+def _map_panel(df_session: pd.DataFrame, current_map_hash: str):
+    """Panel peta; sebagai fragment, interaksi di dalamnya tidak ikut menjalankan ulang form"""
+    st.header("Peta Lokasi")
+    unsaved = pending_row_count()
+    if unsaved:
+        st.caption(f"Peta memuat {unsaved} titik terakhir yang belum tersimpan ke Google Sheets.")
+    # Fallback legend di sidebar/kolom peta (selalu ditampilkan)
+    with st.expander("Legenda Peta (klik untuk lihat)"):
+        st.markdown(_LEGEND_HTML, unsafe_allow_html=True)
+
+    # Peta hanya dibangun ulang jika hash data berubah (lihat map_builder.make_map_html)
+    try:
+        cached_map_html = make_map_html(
+            current_map_hash,
+            df_session,
+            color_col="Color",
+            show_all_columns=True,
+            iframe_width=450,
+            iframe_height=500
+        )
+    except Exception as e:
+        st.warning(f"Gagal membangun peta: {e}")
+        cached_map_html = None
+
+    if cached_map_html is not None:
+        try:
+            # HTML sudah dirender sekali per data-hash; tidak ada render ulang folium per rerun
+            components_html(cached_map_html, width=1200, height=800, scrolling=False)
+        except Exception as e:
+            st.error(f"Gagal menampilkan peta: {e}")
+    else:
+        st.info("Peta belum tersedia (pastikan kolom koordinat ada dan data valid).")
+
 # ----------------- MAIN APP -----------------
 def main():
     st.title("Dashboard Monitoring Temuan K3")
@@ -107,7 +250,8 @@ def main():
 
     # Update session state jika data berubah atau force refresh
     if data_changed or st.session_state.force_refresh or st.session_state.df.empty:
-        st.session_state.df = df_from_sheets
+        # baris antrean yang belum tersimpan ditempel ulang supaya tetap tampil di preview & peta
+        st.session_state.df = with_pending_rows(df_from_sheets)
         st.session_state.last_data_hash = current_hash
         st.session_state.force_refresh = False
 
@@ -116,7 +260,7 @@ def main():
     with col_refresh:
         if st.button("Refresh Data dari Sheets"):
             # Clear cache dan force refresh
-            load_sheets_data.clear()
+            fetch_raw_values.clear()
             st.session_state.force_refresh = True
             st.rerun()
     
@@ -125,115 +269,40 @@ def main():
             st.success("Data ter-update otomatis dari Sheets")
 
     df_session = st.session_state.df
-
-    # Get gspread client untuk form (tanpa cache karena diperlukan untuk write)
-    try:
-        gc = get_gspread_client()
-    except Exception as e:
-        st.error(f"Gagal membuat gspread client untuk form: {e}")
-        return
+    session_hash = _get_data_hash(df_session)
 
     # layout dua kolom utama: kiri = form + kontrol, kanan = peta
     col1, col2 = st.columns([1, 2], gap="large")
 
     # ---------- KIRI: Form + preview ----------
     with col1:
+        # gspread client untuk write hanya diambil saat form memang dirender
         try:
-            render_input_form(df_session, gc)
+            gc = get_gspread_client()
         except Exception as e:
-            st.error(f"Terjadi error di form input: {e}")
+            st.error(f"Gagal membuat gspread client untuk form: {e}")
+            gc = None
+
+        if gc is not None:
+            try:
+                render_input_form(df_session, gc, session_hash)
+            except Exception as e:
+                st.error(f"Terjadi error di form input: {e}")
 
         st.markdown("---")
         st.write("Preview data (session):")
-        st.dataframe(_pretty_df(df_session), width='stretch')
+        unsaved = pending_row_count()
+        if unsaved:
+            st.caption(f"{unsaved} baris terakhir belum tersimpan ke Google Sheets (masih di antrean).")
+        # _pretty_df hanya dihitung ulang jika data session berubah
+        if st.session_state.get("pretty_hash") != session_hash:
+            st.session_state.pretty_df = _pretty_df(df_session)
+            st.session_state.pretty_hash = session_hash
+        st.dataframe(st.session_state.pretty_df, width='stretch')
 
     # ---------- KANAN: Bangun & tampilkan peta ----------
-    # Cache map jika data tidak berubah
-    if "map_hash" not in st.session_state:
-        st.session_state.map_hash = ""
-    if "cached_map" not in st.session_state:
-        st.session_state.cached_map = None
-
-    current_map_hash = _get_data_hash(df_session)
-    
-    # Rebuild map hanya jika data berubah
-    if current_map_hash != st.session_state.map_hash or st.session_state.cached_map is None:
-        try:
-            st.session_state.cached_map = make_map(
-                df_session, 
-                color_col="Color", 
-                show_all_columns=True, 
-                iframe_width=450, 
-                iframe_height=500
-            )
-            st.session_state.map_hash = current_map_hash
-        except Exception as e:
-            st.warning(f"Gagal membangun peta: {e}")
-            st.session_state.cached_map = None
-
     with col2:
-        st.header("Peta Lokasi")
-        # Fallback legend di sidebar/kolom peta (selalu ditampilkan)
-        with st.expander("Legenda Peta (klik untuk lihat)"):
-            st.markdown("""
-            <div style="font-family:Arial,sans-serif;">
-            <b>Level Resiko (warna isi)</b><br>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:16px;height:12px;background:#3d3d3d;border-radius:3px"></div> Lower
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:16px;height:12px;background:#7db86a;border-radius:3px"></div> Low
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:16px;height:12px;background:#f2e804;border-radius:3px"></div> Medium
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:16px;height:12px;background:#ffaa00;border-radius:3px"></div> High
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:16px;height:12px;background:#b10202;border-radius:3px"></div> Emergency
-            </div>
-
-            <hr />
-
-            <b>Indikator Surat (bentuk)</b><br>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <svg width="16" height="16"><circle cx="8" cy="8" r="6" fill="#444"/></svg> Selesai Surat (lingkaran)
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <svg width="16" height="16" viewBox="0 0 16 16"><polygon points="3,3 13,3 13,13 3,13" fill="#444"/></svg> Surat Himbauan (persegi)
-            </div>
-
-            <hr />
-            <b>Indikator Bungkus (warna border)</b><br>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:22px;height:14px;background:#fff;border:3px solid #ff6b35"></div> Pengiriman Usulan
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:22px;height:14px;background:#fff;border:3px solid #28a745"></div> Realisasi Pembungkusan
-            </div>
-            <div style="display:flex;gap:8px;align-items:center;margin-top:6px;">
-              <div style="width:22px;height:14px;background:#fff;border:3px solid #dc3545"></div> Belum Ada Tindak Lanjut
-            </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-        cached_map = st.session_state.cached_map
-
-        if cached_map is not None:
-            try:
-                from streamlit_folium import st_folium
-                # Gunakan key yang stabil untuk menghindari re-render tidak perlu
-                map_data = st_folium(
-                    cached_map, 
-                    width=1200, 
-                    height=800,
-                    key="main_map"  # Key stabil untuk menghindari re-render
-                )
-            except Exception as e:
-                st.error(f"Gagal menampilkan peta: {e}")
-        else:
-            st.info("Peta belum tersedia (pastikan kolom koordinat ada dan data valid).")
+        _map_panel(df_session, session_hash)
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,19 @@
 # forms.py
 
+import io
 import os
 import json
 import tempfile
 import re
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
 from typing import Optional, Any, Union, cast, List, Dict
 
 import streamlit as st
+from PIL import Image, ImageOps
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
@@ -17,24 +21,56 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials as OAuthCredentials
 from google.auth.credentials import Credentials as BaseCredentials
 
-from sheet_io import append_row
+from sheet_io import append_rows
 from utils import risk_to_color_hex, LEVEL_OPTIONS
-from map_builder import make_map  # dipakai untuk update peta lokal setelah submit
 from config import SCOPES
 
 LEVEL_STATE_KEY = "risk_level_value"
+# Baris yang sudah disubmit tapi belum dikirim ke Sheets; dikirim sekaligus via append_rows
+PENDING_ROWS_KEY = "_pending_rows"
+PENDING_SINCE_KEY = "_pending_since"  # waktu baris tertua masuk antrean
+# versi dict (bertipe lokal) dari baris antrean, untuk ditampilkan ulang jika df session diganti data sheet
+PENDING_LOCAL_ROWS_KEY = "_pending_local_rows"
+APPEND_BATCH_SIZE = 5
+# antrean juga dikirim jika baris tertuanya sudah menunggu selama ini (cek setiap rerun)
+APPEND_MAX_WAIT = timedelta(minutes=2)
 # NOTE: gunakan ID folder yang sesuai; ini nilai yang ada di skrip original Anda.
 MAIN_FOLDER_ID = st.secrets["MAIN_FOLDER_ID"]  # Fixed: access from root level
 
 # ----- OAuth (user) config -----
 # Ambil dari secrets instead of file
 TOKEN_FILE = "token_user.json"  # file token yang akan dibuat otomatis
+OAUTH_CREDS_KEY = "_oauth_creds"
+DRIVE_SERVICE_KEY = "_drive_service"
+MONTH_FOLDER_IDS_KEY = "_month_folder_ids"
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)  # refresh token jika sisa umurnya < 10 menit
+UPLOAD_MAX_WORKERS = 4  # jumlah upload dokumentasi yang berjalan paralel
+SIMPLE_UPLOAD_MAX_BYTES = 5 * 1024 * 1024  # di bawah ini pakai upload sekali request (non-resumable)
+PREVIEW_MAX_PX = 400  # sisi terpanjang thumbnail preview dokumentasi
 
 SCOPES_USER = [
     "https://www.googleapis.com/auth/drive.file",
     "https://www.googleapis.com/auth/spreadsheets"
 ]
 
+# Pola regex & format tanggal dikompilasi sekali saat import
+_DIGIT_RE = re.compile(r'\d+')
+_UNSAFE_FN_RE = re.compile(r'[<>:"/\\|?*]')
+_DATE_FORMATS = (
+    "%d/%m/%Y",
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%m/%d/%Y",
+    "%Y/%m/%d",
+)
+# (posisi separator pertama, separator) -> format; DD/MM/YYYY adalah format tulis aplikasi (_format_date_for_sheets)
+_DATE_FAST_DISPATCH = {
+    (2, "/"): "%d/%m/%Y",
+    (2, "-"): "%d-%m-%Y",
+    (4, "-"): "%Y-%m-%d",
+    (4, "/"): "%Y/%m/%d",
+}
+
 # ---------------- utility & helper functions (dari kode lama) ----------------
 
 def _find_level_col(df):
@@ -44,102 +80,84 @@ def _find_level_col(df):
             return c
     return None
 
-def _is_number_column(column_name: str) -> bool:
-    number_keywords = [
-        'no', 'nomor', 'nomer', 'number', 'num', 'urut'
-    ]
-    col_lower = column_name.lower()
-    
-    # Exclude specific columns yang tidak perlu helper
-    excluded_keywords = [
-        'nomer surat pemohonan pembungkusan',
-        'nomer surat pfk', 
-        'idpel',
-        'no meter'
-    ]
-    
+# Kata kunci klasifikasi kolom (tuple konstan, tidak dialokasikan ulang per panggilan)
+NUMBER_KEYWORDS = ('no', 'nomor', 'nomer', 'number', 'num', 'urut')
+# Exclude specific columns yang tidak perlu helper
+NUMBER_EXCLUDED_KEYWORDS = (
+    'nomer surat pemohonan pembungkusan',
+    'nomer surat pfk',
+    'idpel',
+    'no meter',
+)
+DATE_KEYWORDS = ('tanggal', 'tgl', 'date', 'waktu', 'time', 'bulan', 'tahun')
+DATE_EXCLUDED_KEYWORDS = ('petugas', 'nama', 'penemu')
+INDICATOR_KEYWORDS = (
+    'indikator surat',
+    'indikator bungkus',
+    'indikator pfk',
+    'perubahan konstruksi mandiri',
+)
+
+@lru_cache(maxsize=256)
+def _is_number_column(col_lower: str) -> bool:
     # Jika kolom termasuk yang dikecualikan, return False
-    for excluded in excluded_keywords:
+    for excluded in NUMBER_EXCLUDED_KEYWORDS:
         if excluded in col_lower:
             return False
     
-    return any(keyword in col_lower for keyword in number_keywords)
+    return any(keyword in col_lower for keyword in NUMBER_KEYWORDS)
 
 def _get_last_number_from_column(df, column_name: str) -> str:
     if df is None or df.empty or column_name not in df.columns:
         return "Belum ada data"
 
-    # convert to string and strip; replace literal 'nan'/'None'
-    s = df[column_name].astype(str).fillna("").map(lambda x: x.strip())
-
-    # filter out empty-like values
-    bads = {"", "nan", "none"}
-    s_filtered = s[~s.str.lower().isin(bads)]
+    # semua filter dijalankan vektor lewat accessor .str (tanpa loop Python per baris)
+    s = df[column_name].astype("string").str.strip()
+    bads = ["", "nan", "none", "0"]
+    s_filtered = s[s.notna() & ~s.str.lower().isin(bads)]
 
     if s_filtered.empty:
         return "Belum ada data"
 
-    # iterate dari bawah ke atas
-    for val in s_filtered[::-1].tolist():
-        if val is None:
-            continue
-        v = str(val).strip()
-        if v == "" or v.lower() in bads or v == "0":
-            continue
-        # cari angka di string
-        nums = re.findall(r'\d+', v)
-        if nums:
-            # kembalikan full string plus angka terakhir sebagai info
-            return f"{v} (angka: {nums[-1]})"
-        # jika string itu sendiri angka (mungkin '42' atau '42.0')
-        cleaned = v.replace('.', '', 1)
-        if cleaned.isdigit():
-            return v
-        # jika tidak ada angka, kembalikan nilai non-empty pertama yang ditemukan
-        return v
-
-    # fallback
-    last_non_empty = s_filtered.iloc[-1]
-    return str(last_non_empty)
-
-def _is_date_column(column_name: str) -> bool:
-    date_keywords = [
-        'tanggal', 'tgl', 'date', 'waktu', 'time', 'bulan', 'tahun'
-    ]
-    col_lower = column_name.lower()
-    if any(exclude_word in col_lower for exclude_word in ['petugas', 'nama', 'penemu']):
+    # nilai non-empty paling bawah
+    v = str(s_filtered.iloc[-1])
+    # cari angka di string
+    nums = _DIGIT_RE.findall(v)
+    if nums:
+        # kembalikan full string plus angka terakhir sebagai info
+        return f"{v} (angka: {nums[-1]})"
+    # jika tidak ada angka, kembalikan nilai itu sendiri
+    return v
+
+@lru_cache(maxsize=256)
+def _is_date_column(col_lower: str) -> bool:
+    if any(exclude_word in col_lower for exclude_word in DATE_EXCLUDED_KEYWORDS):
         return False
-    return any(keyword in col_lower for keyword in date_keywords)
-
-def _is_indicator_column(column_name: str) -> bool:
-    col_lower = column_name.lower()
-    indicator_keywords = [
-        'indikator surat',
-        'indikator bungkus',
-        'indikator pfk',
-        'perubahan konstruksi mandiri'
-    ]
-    return any(keyword in col_lower for keyword in indicator_keywords)
+    return any(keyword in col_lower for keyword in DATE_KEYWORDS)
 
-def _get_indicator_options(column_name: str) -> list:
+@lru_cache(maxsize=256)
+def _is_indicator_column(col_lower: str) -> bool:
+    return any(keyword in col_lower for keyword in INDICATOR_KEYWORDS)
+
+@lru_cache(maxsize=256)
+def _get_indicator_options(col_lower: str) -> tuple:
     """
-    Mendapatkan pilihan dropdown untuk kolom indikator tertentu
+    Mendapatkan pilihan dropdown untuk kolom indikator tertentu (nama kolom sudah lowercase)
+    (tuple, karena hasilnya di-cache dan dipakai bersama)
     """
-    col_lower = column_name.lower()
-
     if 'indikator surat' in col_lower:
-        return ["Surat Himbauan", "Selesai Surat Ke Muspika"]
+        return ("Surat Himbauan", "Selesai Surat Ke Muspika")
 
     elif 'indikator bungkus' in col_lower:
-        return ["Pengiriman Usulan Pembungkusan Kabel", "Realisasi pembungkusan", "Belum ada Tindak lanjut Bungkus"]
+        return ("Pengiriman Usulan Pembungkusan Kabel", "Realisasi pembungkusan", "Belum ada Tindak lanjut Bungkus")
 
     elif 'indikator pfk' in col_lower:
-        return ["Realisasi PFK", "Terima Permohonan PFK", "Kirim AMS PFK Up3", "Terbit Register PFK", "Tidak mau bayar PFK", "Belum ada Tindak Lanjut PFK"]
+        return ("Realisasi PFK", "Terima Permohonan PFK", "Kirim AMS PFK Up3", "Terbit Register PFK", "Tidak mau bayar PFK", "Belum ada Tindak Lanjut PFK")
 
     elif 'perubahan konstruksi mandiri' in col_lower:
-        return ["Usulan Rubah Konstruksi", "Belum Rubah Konstruksi", "Realisasi Rubah Kons"]
+        return ("Usulan Rubah Konstruksi", "Belum Rubah Konstruksi", "Realisasi Rubah Kons")
 
-    return []
+    return ()
 
 def _format_date_for_sheets(date_obj) -> str:
     """
@@ -151,6 +169,16 @@ def _format_date_for_sheets(date_obj) -> str:
         return date_obj.strftime("%d/%m/%Y")
     return str(date_obj)
 
+def _guess_date_format(s: str) -> Optional[str]:
+    """
+    Pilih satu format dari _DATE_FORMATS berdasarkan posisi separator (tanpa mencoba parse)
+    """
+    if len(s) != 10:
+        return None
+    if s[2] in "/-":
+        return _DATE_FAST_DISPATCH.get((2, s[2]))
+    return _DATE_FAST_DISPATCH.get((4, s[4]))
+
 def _parse_date_from_string(date_str: str) -> date:
     """
     Parse string tanggal dengan berbagai format dan kembalikan sebagai date object
@@ -158,22 +186,37 @@ def _parse_date_from_string(date_str: str) -> date:
     if not date_str or date_str.strip() == "":
         return date.today()
 
-    date_formats = [
-        "%d/%m/%Y",
-        "%Y-%m-%d",
-        "%d-%m-%Y",
-        "%m/%d/%Y",
-        "%Y/%m/%d",
-    ]
+    date_str = date_str.strip()
+    # tebak format dari posisi separator -> biasanya cukup satu strptime tanpa exception
+    fmt = _guess_date_format(date_str)
+    if fmt is not None:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            pass
 
-    for fmt in date_formats:
+    for fmt in _DATE_FORMATS:
         try:
-            return datetime.strptime(date_str.strip(), fmt).date()
+            return datetime.strptime(date_str, fmt).date()
         except ValueError:
             continue
 
     return date.today()
 
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_thumbnail(data: bytes) -> bytes:
+    """
+    Perkecil gambar upload untuk preview (PNG kecil); hasil di-cache agar rerun tidak re-encode
+    """
+    # PNG tidak membawa EXIF: orientasi (foto HP portrait) diterapkan dulu ke piksel
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    img.thumbnail((PREVIEW_MAX_PX, PREVIEW_MAX_PX))
+    if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        img = img.convert("RGB")  # mis. JPEG CMYK tidak bisa disimpan sebagai PNG
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
 def _color_swatch(hex_color: str, label: str = "Color (otomatis)"):
     swatch_html = f"""
     <div style="margin:4px 0 12px 0;">
@@ -190,6 +233,75 @@ def _color_swatch(hex_color: str, label: str = "Color (otomatis)"):
 # ---------------- Drive helper OAuth ONLY ----------------
 
 def get_user_credentials_oauth() -> Optional[Union[OAuthCredentials, BaseCredentials]]:
+    """
+    Kembalikan kredensial OAuth user; disimpan di session_state agar tidak dibangun ulang setiap panggilan
+    """
+    creds = st.session_state.get(OAUTH_CREDS_KEY)
+    if creds is not None and creds.valid and not _expires_soon(creds):
+        return creds
+
+    # refresh lebih awal supaya upload tidak kena 401 di tengah request;
+    # jika refresh gagal tapi token masih berlaku, pakai token itu (dicoba refresh lagi di panggilan berikutnya)
+    if creds is None or not (_refresh_creds(creds) or creds.valid):
+        creds = _load_user_credentials_oauth()
+    if creds is not None:
+        st.session_state[OAUTH_CREDS_KEY] = creds
+    return creds
+
+def _expires_soon(creds) -> bool:
+    """True jika access token akan habis kurang dari TOKEN_REFRESH_MARGIN lagi"""
+    expiry = getattr(creds, "expiry", None)
+    if expiry is None:
+        return False
+    # google-auth menyimpan expiry sebagai datetime UTC naive
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return expiry - now < TOKEN_REFRESH_MARGIN
+
+def _refresh_creds(creds) -> bool:
+    if not getattr(creds, "refresh_token", None):
+        return False
+    try:
+        creds.refresh(Request())
+    except Exception:
+        return False
+    _save_creds_merged(TOKEN_FILE, creds)
+    return True
+
+def _save_creds_merged(path: str, creds) -> None:
+    """
+    Simpan token ke file lokal (optional untuk backup) dengan merge ke isi lama:
+    field yang kosong di creds baru (mis. refresh_token) tidak menimpa nilai yang tersimpan.
+    """
+    if not creds or not hasattr(creds, "to_json"):
+        return
+    old: Dict[str, Any] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            old = json.load(f)
+    except Exception:
+        old = {}  # file belum ada / rusak -> tulis baru
+    try:
+        new = json.loads(creds.to_json())
+        old.update({k: v for k, v in new.items() if v})
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(old, f)
+        os.replace(tmp_path, path)  # atomic: file lama tidak pernah setengah tertulis
+    except Exception:
+        pass  # Tidak perlu menampilkan pesan error untuk ini
+
+def _get_drive_service(creds):
+    """
+    Drive service dipakai ulang selama objek kredensialnya sama
+    """
+    cached = st.session_state.get(DRIVE_SERVICE_KEY)
+    if cached is not None and cached[0] is creds:
+        return cached[1]
+    service = build("drive", "v3", credentials=creds)
+    st.session_state[DRIVE_SERVICE_KEY] = (creds, service)
+    return service
+
+def _load_user_credentials_oauth() -> Optional[Union[OAuthCredentials, BaseCredentials]]:
     creds: Optional[Union[OAuthCredentials, BaseCredentials]] = None
 
     # 1) Coba baca dari st.secrets (Streamlit Secrets) dulu
@@ -206,7 +318,7 @@ def get_user_credentials_oauth() -> Optional[Union[OAuthCredentials, BaseCredent
             creds = OAuthCredentials.from_authorized_user_info(info, SCOPES_USER)
             
             # Test validitas credentials
-            if creds and creds.valid:
+            if creds and creds.valid and not _expires_soon(creds):
                 return creds
                 
         except Exception:
@@ -219,12 +331,14 @@ def get_user_credentials_oauth() -> Optional[Union[OAuthCredentials, BaseCredent
         except Exception:
             creds = None
 
-    # 3) Jika ada creds tapi expired, coba refresh (jika ada refresh_token)
-    if creds and getattr(creds, "expired", False) and getattr(creds, "refresh_token", None):
+    # 3) Jika ada creds tapi expired / hampir expired, coba refresh (jika ada refresh_token)
+    if creds and (getattr(creds, "expired", False) or _expires_soon(creds)) and getattr(creds, "refresh_token", None):
         try:
             creds.refresh(Request())
         except Exception:
-            creds = None
+            # refresh dini gagal: token yang masih berlaku tetap dipakai, hanya token expired yang dibuang
+            if not creds.valid:
+                creds = None
 
     # 4) Jika masih belum ada creds valid -> lakukan OAuth flow interaktif
     if not creds or not creds.valid:
@@ -265,12 +379,7 @@ def get_user_credentials_oauth() -> Optional[Union[OAuthCredentials, BaseCredent
             return None
 
     # 5) Simpan token ke file lokal jika berhasil (optional untuk backup)
-    if creds and hasattr(creds, "to_json"):
-        try:
-            with open(TOKEN_FILE, "w", encoding="utf-8") as f:
-                f.write(creds.to_json())
-        except Exception:
-            pass  # Tidak perlu menampilkan pesan error untuk ini
+    _save_creds_merged(TOKEN_FILE, creds)
 
     return creds
 
@@ -297,60 +406,59 @@ def create_folder_if_not_exists_oauth(service, parent_folder_id, folder_name):
         st.error(f"Gagal mengakses Drive untuk membuat folder: {e}")
         raise
 
-def upload_to_drive_oauth_only(local_path: str, folder_id: Optional[str], file_name: str) -> Optional[str]:
+def _get_folder_id_cached(service, parent_folder_id, folder_name):
     """
-    Upload file menggunakan OAuth user credentials saja
+    ID folder (parent, nama) di-cache di session_state; Drive hanya di-query sekali per sesi
     """
-    try:
-        creds = get_user_credentials_oauth()
-        if not creds:
-            st.error("Gagal mendapatkan kredensial OAuth")
-            return None
-            
-        service = build("drive", "v3", credentials=creds)
-
-        # Type hint meta agar Pylance tahu parents boleh list
-        meta: Dict[str, Union[str, List[str]]] = {"name": file_name}
-
-        if folder_id:
-            meta["parents"] = [folder_id]
+    folder_ids = st.session_state.setdefault(MONTH_FOLDER_IDS_KEY, {})
+    key = (parent_folder_id, folder_name)
+    if key not in folder_ids:
+        folder_ids[key] = create_folder_if_not_exists_oauth(service, parent_folder_id, folder_name)
+    return folder_ids[key]
 
-        media = MediaFileUpload(local_path, resumable=True)
-        file = service.files().create(
-            body=meta,
-            media_body=media,
-            fields="id, parents"
-        ).execute()
+def _upload_with_service(service, media: MediaIoBaseUpload, folder_id: Optional[str], file_name: str) -> Optional[str]:
+    """
+    Upload satu file (media di memori, lihat _make_upload_media) dengan Drive service yang diberikan;
+    error dilempar ke pemanggil
+    """
+    # Type hint meta agar Pylance tahu parents boleh list
+    meta: Dict[str, Union[str, List[str]]] = {"name": file_name}
+
+    if folder_id:
+        meta["parents"] = [folder_id]
+
+    file = service.files().create(
+        body=meta,
+        media_body=media,
+        fields="id, parents"
+    ).execute()
+
+    # Return URL format
+    file_id = file.get("id")
+    if file_id:
+        return f"https://drive.google.com/uc?id={file_id}"
+    return None
 
-        # Return URL format
-        file_id = file.get("id")
-        if file_id:
-            return f"https://drive.google.com/uc?id={file_id}"
-        return None
-    except Exception as e:
-        st.error(f"Gagal upload file menggunakan OAuth: {e}")
-        return None
+def _upload_worker(creds, media: MediaIoBaseUpload, folder_id: Optional[str], file_name: str) -> Optional[str]:
+    """
+    Dijalankan di thread pool: tidak boleh memanggil API st.*.
+    Tiap worker membangun Drive service sendiri karena transport httplib2 tidak thread-safe.
+    """
+    service = build("drive", "v3", credentials=creds, cache_discovery=False)
+    return _upload_with_service(service, media, folder_id, file_name)
 
-def save_uploaded_file(uploaded_file) -> Optional[str]:
+def _make_upload_media(uploaded_file) -> Optional[MediaIoBaseUpload]:
     """
-    Simpan uploaded file ke direktori sementara dan return path string
+    Bungkus UploadedFile Streamlit langsung dari memori (tanpa file sementara di disk)
     """
-    try:
-        os.makedirs("temp_images", exist_ok=True)
-        
-        # Pastikan uploaded_file adalah UploadedFile object, bukan AttrDict
-        if hasattr(uploaded_file, 'name') and hasattr(uploaded_file, 'getbuffer'):
-            file_path = os.path.join("temp_images", uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            return file_path
-        else:
-            st.error("Format file upload tidak valid")
-            return None
-            
-    except Exception as e:
-        st.error(f"Gagal menyimpan gambar: {e}")
+    # Pastikan uploaded_file adalah UploadedFile object, bukan AttrDict
+    if not (hasattr(uploaded_file, 'name') and hasattr(uploaded_file, 'getbuffer')):
         return None
+    buf = io.BytesIO(uploaded_file.getbuffer())
+    # file kecil: multipart sekali request; file besar: resumable tapi dikirim dalam satu chunk
+    resumable = buf.getbuffer().nbytes >= SIMPLE_UPLOAD_MAX_BYTES
+    mimetype = getattr(uploaded_file, 'type', None) or "application/octet-stream"
+    return MediaIoBaseUpload(buf, mimetype=mimetype, resumable=resumable, chunksize=-1)
 
 def _generate_file_name(uploaded_file, column_name: str, input_vals: Dict) -> str:
     """
@@ -384,7 +492,7 @@ def _generate_file_name(uploaded_file, column_name: str, input_vals: Dict) -> st
         identifier = "Unknown"
     
     # Bersihkan identifier dari karakter yang tidak aman untuk nama file
-    identifier = re.sub(r'[<>:"/\\|?*]', '_', identifier)
+    identifier = _UNSAFE_FN_RE.sub('_', identifier)
     
     # Format nama file: {identifier}_{column_name}_{original_filename}
     # Pastikan kita mendapatkan nama file yang benar
@@ -397,9 +505,233 @@ def _generate_file_name(uploaded_file, column_name: str, input_vals: Dict) -> st
     
     return final_name
 
+def _flush_pending_rows(gc) -> int:
+    """
+    Kirim semua baris di antrean ke Google Sheets dalam satu request.
+    Antrean hanya dikosongkan jika pengiriman berhasil. Return jumlah baris terkirim.
+    """
+    pending = st.session_state.get(PENDING_ROWS_KEY) or []
+    if not pending:
+        return 0
+    append_rows(gc, pending)
+    st.session_state[PENDING_ROWS_KEY] = []
+    st.session_state[PENDING_LOCAL_ROWS_KEY] = []
+    st.session_state.pop(PENDING_SINCE_KEY, None)
+    return len(pending)
+
+def _queue_row(row: List[Any], local_row: Dict[str, Any]) -> List[List[Any]]:
+    """
+    Masukkan satu baris ke antrean (dan catat waktu jika antrean sebelumnya kosong).
+    row = nilai untuk Sheets; local_row = nilai untuk df session (lihat with_pending_rows)
+    """
+    pending = st.session_state.setdefault(PENDING_ROWS_KEY, [])
+    if not pending:
+        st.session_state[PENDING_SINCE_KEY] = datetime.now(timezone.utc)
+        st.session_state[PENDING_LOCAL_ROWS_KEY] = []
+    pending.append(row)
+    st.session_state[PENDING_LOCAL_ROWS_KEY].append(local_row)
+    return pending
+
+def with_pending_rows(df):
+    """
+    Tambahkan baris antrean yang belum tersimpan ke df hasil baca sheet, supaya preview & peta
+    tetap memuatnya saat df session diganti (refresh manual / data sheet berubah)
+    """
+    for local_row in st.session_state.get(PENDING_LOCAL_ROWS_KEY) or []:
+        df = _append_local_row(df, local_row)
+    return df
+
+def _queue_expired() -> bool:
+    """True jika baris tertua di antrean sudah menunggu lebih dari APPEND_MAX_WAIT"""
+    since = st.session_state.get(PENDING_SINCE_KEY)
+    if since is None or not st.session_state.get(PENDING_ROWS_KEY):
+        return False
+    return datetime.now(timezone.utc) - since >= APPEND_MAX_WAIT
+
+def pending_row_count() -> int:
+    """Jumlah baris yang sudah tampil di preview/peta tetapi belum tersimpan ke Google Sheets"""
+    return len(st.session_state.get(PENDING_ROWS_KEY) or [])
+
+def _render_pending_rows(gc):
+    pending = st.session_state.get(PENDING_ROWS_KEY) or []
+    if not pending:
+        return
+    if _queue_expired():
+        # antrean terlalu lama menunggu -> kirim otomatis pada rerun ini
+        try:
+            sent = _flush_pending_rows(gc)
+            st.success(f"{sent} baris di antrean otomatis ditambahkan ke Google Sheets!")
+            return
+        except Exception as e:
+            st.error(f"Gagal mengirim antrean ke Sheets: {e}")
+    st.warning(f"{len(pending)} baris belum tersimpan ke Google Sheets (file dokumentasinya sudah di Drive). "
+               "Baris akan hilang jika sesi ditutup sebelum antrean dikirim.")
+    if st.button("Kirim antrean ke Google Sheets"):
+        try:
+            sent = _flush_pending_rows(gc)
+            st.success(f"{sent} baris berhasil ditambahkan ke Google Sheets!")
+        except Exception as e:
+            st.error(f"Gagal menambah data ke Sheets: {e}")
+
+# Ketentuan skip: jangan render input untuk kolom 'koordinat' atau lat/lon/color
+SKIP_KEYS = ("latitude", "longitude", "color")
+SKIP_SUBSTRINGS = SKIP_KEYS + ("koordinat", "coord")
+COLUMN_CLASSES_KEY = "_col_classes"
+
+def _classify_columns(columns, level_col: Optional[str], cl_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Klasifikasi setiap kolom sekali jalan menjadi salah satu jenis input:
+    "skip" | "doc" | "penyulang" | "indicator" | "date" | "number" | "text"
+    cl_map: {kolom: kolom.lower()} yang sudah dihitung (opsional)
+    """
+    classes: Dict[str, str] = {}
+    for c in columns:
+        cl = cl_map[c] if cl_map is not None else c.lower()
+        if c == level_col or any(k in cl for k in SKIP_SUBSTRINGS):
+            classes[c] = "skip"
+        elif "dokumentasi" in cl:
+            classes[c] = "doc"
+        elif "penyulang" in cl:
+            classes[c] = "penyulang"
+        elif _is_indicator_column(cl):
+            classes[c] = "indicator"
+        elif _is_date_column(cl):
+            classes[c] = "date"
+        elif _is_number_column(cl):
+            classes[c] = "number"
+        else:
+            classes[c] = "text"
+    return classes
+
+def _get_column_classes(df, level_col: Optional[str], data_hash: str) -> Dict[str, str]:
+    """
+    Hasil _classify_columns di-cache di session_state selama skema kolom tidak berubah
+    """
+    key = (tuple(df.columns), level_col)
+    cached = st.session_state.get(COLUMN_CLASSES_KEY)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    classes = _classify_columns(df.columns, level_col, _get_col_cache(df, data_hash)["lower"])
+    st.session_state[COLUMN_CLASSES_KEY] = (key, classes)
+    return classes
+
+COLUMN_CACHE_KEY = "_col_cache"
+PENYULANG_OPTIONS = ("Dinoyo", "Matos")
+
+def _get_col_cache(df, data_hash: str) -> Dict[str, Any]:
+    """
+    Cache per isi data (kolom + digest df session dari app.py) di session_state: kolom level
+    dan daftar nilai unik per kolom, supaya rerun tidak memindai ulang df.
+    Edit sel tanpa menambah baris pun mengganti digest, jadi opsi dropdown ikut diperbarui.
+    """
+    key = (tuple(df.columns), data_hash)
+    cache = st.session_state.get(COLUMN_CACHE_KEY)
+    if cache is None or cache.get("key") != key:
+        cache = {
+            "key": key,
+            "level_col": _find_level_col(df),
+            "lower": {c: c.lower() for c in df.columns},  # nama kolom lowercase, dihitung sekali
+            "unique": {},
+        }
+        st.session_state[COLUMN_CACHE_KEY] = cache
+    return cache
+
+def _existing_values(df, col: str, data_hash: str) -> List[Any]:
+    """
+    Nilai unik non-kosong pada kolom (di-cache sesuai _get_col_cache)
+    """
+    if df.empty or col not in df.columns:
+        return []
+    unique = _get_col_cache(df, data_hash)["unique"]
+    if col not in unique:
+        values = df[col].dropna().astype(str).str.strip()
+        unique[col] = [x for x in values.unique().tolist() if x != ""]
+    return unique[col]
+
+def _merge_options(df, col: Optional[str], base, data_hash: str) -> List[Any]:
+    """
+    Gabungkan opsi default dengan nilai yang sudah ada di kolom
+    (dedup via dict.fromkeys: urutan kemunculan pertama dipertahankan)
+    """
+    existing = _existing_values(df, col, data_hash) if col else []
+    return list(dict.fromkeys([*base, *existing]))
+
+FORM_DEFAULTS_KEY = "_form_defaults"
+
+def _get_form_defaults(df, col_classes: Dict[str, str], data_hash: str) -> Dict[str, Any]:
+    """
+    Nilai default widget yang butuh scan data (tanggal terakhir, nomor terakhir),
+    dihitung sekali per isi data (kolom + digest df session) lalu dipakai ulang di setiap rerun.
+    """
+    key = (tuple(df.columns), data_hash)
+    cached = st.session_state.get(FORM_DEFAULTS_KEY)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    defaults: Dict[str, Any] = {}
+    for c, kind in col_classes.items():
+        if kind == "date":
+            # None -> pakai tanggal hari ini saat render
+            defaults[c] = None
+            if not df.empty:
+                existing_dates = df[c].dropna()
+                if not existing_dates.empty:
+                    try:
+                        last_date_str = str(existing_dates.iloc[-1])
+                        if last_date_str and last_date_str != "":
+                            defaults[c] = _parse_date_from_string(last_date_str)
+                    except Exception:
+                        defaults[c] = None
+        elif kind == "number":
+            defaults[c] = _get_last_number_from_column(df, c)
+
+    st.session_state[FORM_DEFAULTS_KEY] = (key, defaults)
+    return defaults
+
+def _append_local_row(df, new_row: Dict[str, Any]):
+    """
+    Tambah satu baris ke df: baris baru dibangun sebagai frame satu baris, nilainya
+    dikonversi & di-cast ke dtype kolom df, lalu digabung dengan pd.concat. Karena dtype kedua frame sama,
+    concat tidak meng-upcast kolom (int tetap int, string/category/float tetap).
+    """
+    import pandas as pd
+
+    row_df = pd.DataFrame([{c: new_row.get(c, "") for c in df.columns}], columns=df.columns)
+    base = df
+
+    def _retype_base(col, dtype):
+        nonlocal base
+        if base is df:
+            base = df.copy(deep=False)  # kolom df lama tidak ikut berubah
+        base[col] = base[col].astype(dtype)
+
+    for col, dtype in df.dtypes.items():
+        val = row_df[col].iloc[0]
+        if isinstance(dtype, pd.CategoricalDtype):
+            if not pd.isna(val) and val not in dtype.categories:
+                # kategori harus identik di kedua frame, kalau tidak concat jatuh ke object
+                dtype = pd.CategoricalDtype(dtype.categories.append(pd.Index([val])), ordered=dtype.ordered)
+                _retype_base(col, dtype)
+        elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            # teks/kosong di kolom numerik -> NaN, bukan upcast kolom ke object
+            row_df[col] = pd.to_numeric(row_df[col], errors="coerce")
+            if pd.api.types.is_integer_dtype(dtype) and row_df[col].isna().any():
+                # kolom int yang menerima nilai kosong -> Int64 (nullable), bukan float (1.0, 2.0, ...)
+                dtype = pd.Int64Dtype()
+                _retype_base(col, dtype)
+        elif pd.api.types.is_string_dtype(dtype):
+            row_df[col] = "" if val is None else str(val)
+        try:
+            row_df[col] = row_df[col].astype(dtype)
+        except (ValueError, TypeError):
+            pass  # nilai tidak bisa dikonversi: biarkan concat menentukan dtype kolom
+    # concat menghasilkan frame baru, jadi df lama (dan hash yang di-memo untuknya) tidak berubah
+    return pd.concat([base, row_df], ignore_index=True)
+
 # ---------------- End helper functions ----------------
 
-def render_input_form(df, gc):
+def render_input_form(df, gc, data_hash: str):
+    """data_hash: digest df session (app._get_data_hash), kunci cache opsi & default form"""
     st.header("Tambah / Edit Data")
     st.write("Isi form untuk menambah baris baru ke Google Sheets")
 
@@ -407,17 +739,12 @@ def render_input_form(df, gc):
         st.warning("Sheet tampak tidak memiliki header kolom.")
         return
 
-    level_col = _find_level_col(df)
+    level_col = _get_col_cache(df, data_hash)["level_col"]
 
     # Build pilihan level (gabungan default + existing)
     selected_level = ""
     if level_col:
-        existing_levels = [x for x in df[level_col].dropna().unique().tolist() if str(x).strip() != ""]
-        seen, merged = set(), []
-        for x in LEVEL_OPTIONS + existing_levels:
-            if x not in seen:
-                merged.append(x)
-                seen.add(x)
+        merged = _merge_options(df, level_col, LEVEL_OPTIONS, data_hash)
 
         selected_level = st.selectbox(
             label=level_col,
@@ -452,38 +779,35 @@ def render_input_form(df, gc):
         input_vals["Latitude"] = lat
         input_vals["Longitude"] = lon
 
-        # Ketentuan skip: jangan render input untuk kolom 'koordinat' atau lat/lon/color
-        SKIP_KEYS = ["latitude", "longitude", "color"]
+        col_classes = _get_column_classes(df, level_col, data_hash)
+        form_defaults = _get_form_defaults(df, col_classes, data_hash)
+        cl_map = _get_col_cache(df, data_hash)["lower"]
+        # kolom dokumentasi yang berisi file -> UploadedFile (hanya kolom ini yang diproses saat submit)
+        uploaded_by_col: Dict[str, Any] = {}
 
         for c in df.columns:
-            cl = c.lower()
+            kind = col_classes[c]
             # skip kolom special
-            if c == level_col or any(k in cl for k in SKIP_KEYS) or "koordinat" in cl or "coord" in cl:
+            if kind == "skip":
                 continue
 
             # Jika kolom adalah dokumentasi -> file uploader
-            if "dokumentasi" in cl:
+            if kind == "doc":
                 uploaded_file = st.file_uploader(f"Upload {c} (jpg, png, jpeg)", type=["jpg", "png", "jpeg"], key=f"upload_{c}")
                 if uploaded_file:
                     # Simpan reference ke file untuk diproses nanti setelah semua input selesai
-                    input_vals[f"_uploaded_file_{c}"] = uploaded_file
-                    input_vals[f"_column_name_{c}"] = c
+                    uploaded_by_col[c] = uploaded_file
                     # Preview gambar
                     try:
-                        st.image(uploaded_file, caption=f"Preview {c}", use_container_width=True)
+                        st.image(_make_thumbnail(uploaded_file.getvalue()), caption=f"Preview {c}", width=PREVIEW_MAX_PX)
                     except Exception as e:
                         st.warning(f"Tidak dapat menampilkan preview: {e}")
                 input_vals[c] = ""  # Set empty dulu, akan diisi URL setelah upload
                 continue
 
             # Jika kolom adalah penyulang -> dropdown
-            if "penyulang" in cl:
-                penyulang_options = ["Dinoyo", "Matos"]
-                if not df.empty and c in df.columns:
-                    existing_values = [x for x in df[c].dropna().unique().tolist() if str(x).strip() != ""]
-                    for val in existing_values:
-                        if val not in penyulang_options:
-                            penyulang_options.append(val)
+            if kind == "penyulang":
+                penyulang_options = _merge_options(df, c, PENYULANG_OPTIONS, data_hash)
 
                 selected_penyulang = st.selectbox(
                     label=c,
@@ -495,13 +819,8 @@ def render_input_form(df, gc):
                 continue
 
             # Jika kolom adalah indikator khusus -> dropdown
-            if _is_indicator_column(c):
-                indicator_options = _get_indicator_options(c)
-                if not df.empty and c in df.columns:
-                    existing_values = [x for x in df[c].dropna().unique().tolist() if str(x).strip() != ""]
-                    for val in existing_values:
-                        if val not in indicator_options:
-                            indicator_options.append(val)
+            if kind == "indicator":
+                indicator_options = _merge_options(df, c, _get_indicator_options(cl_map[c]), data_hash)
 
                 all_options = [""] + indicator_options
                 selected_indicator = st.selectbox(
@@ -514,21 +833,10 @@ def render_input_form(df, gc):
                 continue
 
             # Jika kolom adalah tanggal -> date picker
-            if _is_date_column(c):
-                default_date = date.today()
-                if not df.empty and c in df.columns:
-                    existing_dates = df[c].dropna()
-                    if not existing_dates.empty:
-                        try:
-                            last_date_str = str(existing_dates.iloc[-1])
-                            if last_date_str and last_date_str != "":
-                                default_date = _parse_date_from_string(last_date_str)
-                        except Exception:
-                            default_date = date.today()
-
+            if kind == "date":
                 selected_date = st.date_input(
                     label=f"{c}",
-                    value=default_date,
+                    value=form_defaults.get(c) or date.today(),
                     help=f"Pilih tanggal untuk {c}",
                     format="DD/MM/YYYY"
                 )
@@ -536,12 +844,11 @@ def render_input_form(df, gc):
                 continue
 
             # Untuk kolom nomor -> tampilkan dengan informasi tambahan
-            if _is_number_column(c):
-                last_number = _get_last_number_from_column(df, c)
+            if kind == "number":
                 input_vals[c] = st.text_input(
                     label=c,
                     value="",
-                    help=f"Nomor terakhir: {last_number}"
+                    help=f"Nomor terakhir: {form_defaults[c]}"
                 )
                 continue
 
@@ -563,68 +870,63 @@ def render_input_form(df, gc):
             upload_success = True
             failed_uploads = []
             
-            for col in df.columns:
-                if f"_uploaded_file_{col}" in input_vals and input_vals[f"_uploaded_file_{col}"] is not None:
-                    uploaded_file = input_vals[f"_uploaded_file_{col}"]
-                    
-                    # Simpan file sementara - PASTIKAN uploaded_file adalah object yang benar
-                    file_path = save_uploaded_file(uploaded_file)
-                    if file_path:
-                        try:
-                            # Buat folder bulan menggunakan OAuth
-                            creds = get_user_credentials_oauth()
-                            if not creds:
-                                failed_uploads.append(col)
-                                input_vals[col] = ""
-                                continue
-                                
-                            service = build('drive', 'v3', credentials=creds)
-                            month_folder = datetime.now().strftime('%B')
-                            month_folder_id = create_folder_if_not_exists_oauth(service, MAIN_FOLDER_ID, month_folder)
-                            
-                            # Generate nama file dengan data input yang sudah lengkap
-                            file_name = _generate_file_name(uploaded_file, col, input_vals)
-                            
-                            # Upload file menggunakan OAuth saja
-                            file_url = upload_to_drive_oauth_only(file_path, month_folder_id, file_name)
-                            if file_url:
-                                input_vals[col] = file_url
-                            else:
-                                failed_uploads.append(col)
-                                input_vals[col] = ""
-                        except Exception:
-                            failed_uploads.append(col)
-                            input_vals[col] = ""
-                        finally:
-                            # Hapus file sementara
-                            try:
-                                if os.path.exists(file_path):
-                                    os.remove(file_path)
-                            except Exception:
-                                pass
+            # Kumpulkan semua file dulu: (kolom, media di memori, nama file di Drive)
+            upload_tasks = []
+            for col, uploaded_file in uploaded_by_col.items():
+                media = _make_upload_media(uploaded_file)
+                if media is not None:
+                    # Generate nama file dengan data input yang sudah lengkap
+                    file_name = _generate_file_name(uploaded_file, col, input_vals)
+                    upload_tasks.append((col, media, file_name))
+                else:
+                    st.error("Format file upload tidak valid")
+                    failed_uploads.append(col)
+
+            if upload_tasks:
+                try:
+                    # Buat folder bulan menggunakan OAuth
+                    creds = get_user_credentials_oauth()
+                    if not creds:
+                        failed_uploads.extend(col for col, _, _ in upload_tasks)
                     else:
-                        failed_uploads.append(col)
-                        input_vals[col] = ""
+                        service = _get_drive_service(creds)
+                        month_folder = datetime.now().strftime('%B')
+                        month_folder_id = _get_folder_id_cached(service, MAIN_FOLDER_ID, month_folder)
+
+                        # Upload paralel; hasil & pesan error diproses di thread utama
+                        with ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as ex:
+                            futures = {
+                                ex.submit(_upload_worker, creds, media, month_folder_id, name): col
+                                for col, media, name in upload_tasks
+                            }
+                            for fut in as_completed(futures):
+                                col = futures[fut]
+                                try:
+                                    file_url = fut.result()
+                                except Exception as e:
+                                    st.error(f"Gagal upload file {col} menggunakan OAuth: {e}")
+                                    file_url = None
+                                if file_url:
+                                    input_vals[col] = file_url
+                                else:
+                                    failed_uploads.append(col)
+                except Exception:
+                    failed_uploads.extend(col for col, _, _ in upload_tasks
+                                          if not input_vals.get(col) and col not in failed_uploads)
 
             # Tampilkan hasil upload hanya jika ada file yang diupload
-            uploaded_files = [col for col in df.columns if f"_uploaded_file_{col}" in input_vals]
-            if uploaded_files:
+            if uploaded_by_col:
                 if not failed_uploads:
                     st.success("Semua file berhasil diupload ke Google Drive")
-                elif len(failed_uploads) < len(uploaded_files):
+                elif len(failed_uploads) < len(uploaded_by_col):
                     st.warning(f"Beberapa file gagal diupload: {', '.join(failed_uploads)}")
                 else:
                     st.error("Semua file gagal diupload. Data akan disimpan tanpa lampiran.")
 
-            # Bersihkan kunci sementara dari input_vals
-            temp_keys = [k for k in input_vals.keys() if k.startswith("_uploaded_file_") or k.startswith("_column_name_")]
-            for temp_key in temp_keys:
-                input_vals.pop(temp_key, None)
-
             # build row sesuai urutan kolom di sheet
             row = []
             for col in df.columns:
-                cl = col.lower()
+                cl = cl_map[col]
                 if col == level_col:
                     row.append(level_value)
                 elif "koordinat" in cl or cl == "coord" or cl == "coordinates":
@@ -639,63 +941,68 @@ def render_input_form(df, gc):
                 elif "dokumentasi" in cl:
                     # gunakan nilai yang sudah diset dalam input_vals (hasil upload atau empty)
                     row.append(input_vals.get(col, ""))
-                elif _is_date_column(col):
+                elif _is_date_column(cl):
                     row.append(input_vals.get(col, ""))
                 else:
                     row.append(input_vals.get(col, ""))
 
-            # Tambah ke Google Sheets
-            try:
-                append_row(gc, row)
-                st.success("Data berhasil ditambahkan ke Google Sheets!")
-            except Exception as e:
-                st.error(f"Gagal menambah data ke Sheets: {e}")
-                return
+            # nilai baris untuk df session lokal (tipe lokal: lat/lon float, koordinat teks asli)
+            new_row = {}
+            for col in df.columns:
+                cl = cl_map[col]
+                if col == level_col:
+                    new_row[col] = level_value
+                elif "koordinat" in cl or cl == "coord" or cl == "coordinates":
+                    new_row[col] = coordinates if coordinates else ""
+                elif cl == "color":
+                    new_row[col] = auto_hex
+                elif cl in ["latitude", "lat"]:
+                    new_row[col] = float(lat) if lat is not None else float("nan")
+                elif cl in ["longitude", "lon", "lng"]:
+                    new_row[col] = float(lon) if lon is not None else float("nan")
+                elif _is_date_column(cl):
+                    new_row[col] = input_vals.get(col, "")
+                else:
+                    new_row[col] = input_vals.get(col, "")
+
+            # Masukkan ke antrean; kirim ke Google Sheets sekaligus saat antrean penuh
+            pending = _queue_row(row, new_row)
+            row_saved = False
+            if len(pending) >= APPEND_BATCH_SIZE or _queue_expired():
+                try:
+                    sent = _flush_pending_rows(gc)
+                    row_saved = True
+                    st.success(f"{sent} baris berhasil ditambahkan ke Google Sheets!")
+                except Exception as e:
+                    # baris tetap di antrean & dikirim ulang bersama antrean berikutnya -> jangan submit ulang
+                    st.error(f"Gagal mengirim antrean ke Sheets: {e}. Data ini tetap di antrean "
+                             f"({len(pending)} baris) dan akan dikirim ulang; tidak perlu submit ulang.")
+            else:
+                st.success(f"Data masuk antrean ({len(pending)}/{APPEND_BATCH_SIZE}); "
+                           "klik 'Kirim antrean ke Google Sheets' untuk menyimpan sekarang.")
 
             # update session_state.df lokal (append satu row) supaya peta diperbarui
             try:
-                import pandas as pd
                 existing_df = st.session_state.get("df")
                 if existing_df is None or existing_df.empty:
-                    local_df = pd.DataFrame(columns=df.columns)
-                else:
-                    local_df = existing_df.copy()
-
-                new_row = {}
-                for col in df.columns:
-                    cl = col.lower()
-                    if col == level_col:
-                        new_row[col] = level_value
-                    elif "koordinat" in cl or cl == "coord" or cl == "coordinates":
-                        new_row[col] = coordinates if coordinates else ""
-                    elif cl == "color":
-                        new_row[col] = auto_hex
-                    elif cl in ["latitude", "lat"]:
-                        new_row[col] = float(lat) if lat is not None else ""
-                    elif cl in ["longitude", "lon", "lng"]:
-                        new_row[col] = float(lon) if lon is not None else ""
-                    elif _is_date_column(col):
-                        new_row[col] = input_vals.get(col, "")
-                    else:
-                        new_row[col] = input_vals.get(col, "")
+                    # frame kosong dengan dtype yang sama (string/category/float) seperti df
+                    existing_df = df.iloc[0:0]
 
-                local_df = pd.concat([local_df, pd.DataFrame([new_row])], ignore_index=True)
-                st.session_state.df = cast(Any, local_df)
-
-                try:
-                    st.session_state.map = cast(Any, make_map(st.session_state.df, color_col="Color", show_all_columns=True, iframe_width=450, iframe_height=500))
-                except Exception:
-                    pass
+                st.session_state.df = cast(Any, _append_local_row(existing_df, new_row))
 
             except Exception as e:
-                st.warning(f"Data berhasil ditambahkan ke Sheets, namun terjadi error saat update tampilan lokal: {e}")
+                if row_saved:
+                    st.warning(f"Data berhasil ditambahkan ke Sheets, namun terjadi error saat update tampilan lokal: {e}")
+                else:
+                    st.warning(f"Data masuk antrean (belum tersimpan ke Sheets), namun terjadi error saat update tampilan lokal: {e}")
 
             # tampilkan ringkasan tanggal
             date_summary = []
             for col in df.columns:
-                if _is_date_column(col) and col in input_vals and input_vals[col]:
+                if _is_date_column(cl_map[col]) and col in input_vals and input_vals[col]:
                     date_summary.append(f"**{col}**: {input_vals[col]}")
             if date_summary:
                 st.info("**Tanggal yang diinput:**\n" + "\n".join(date_summary))
 
-            return
+    # tombol flush di luar form (st.button tidak boleh berada di dalam st.form)
+    _render_pending_rows(gc)
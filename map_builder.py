@@ -1,367 +1,386 @@
 # map_builder.py
-from typing import Optional, List, Tuple, Any, cast
+from typing import Optional, List, Tuple, Any, Iterable, Iterator, NamedTuple, cast
+from pathlib import Path
+import hashlib
+from html import escape
+import os
 import re
+import zlib
 
+import numpy as np
 import pandas as pd
 import folium
+from folium.plugins import FastMarkerCluster
 import streamlit as st
 from branca.element import Element
 
-from utils import risk_to_color_hex, LEVEL_OPTIONS
+from utils import risk_to_color_hex, LEVEL_OPTIONS, RISK_TO_HEX
 
 # Regular expression untuk menangkap angka float dalam string koordinat
 FLOAT_RE = r"([+-]?[0-9]+(?:\.[0-9]+)?)"
-
-
-def _find_level_col(columns: List[str]) -> Optional[str]:
+# Pola dikompilasi sekali saat import
+FLOAT_RE_C = re.compile(FLOAT_RE)
+HEX_RE_C = re.compile(r"^#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})$")
+
+
+MARKER_LAYER_NAME = "markers"
+
+# Cache disk untuk HTML peta agar tetap ada setelah worker restart / antar replika
+MAP_CACHE_DIR = Path(__file__).resolve().parent / ".cache" / "maps"
+MAP_CACHE_MAX_FILES = 16
+# Naikkan setiap kali output HTML marker/popup/legend berubah; bersama versi folium ikut masuk
+# kunci cache disk, jadi HTML dari versi lama tidak terpakai setelah deploy
+MAP_RENDER_VERSION = 2
+_MAP_CACHE_SALT = f"{MAP_RENDER_VERSION}|{folium.__version__}"
+# Di atas jumlah titik ini marker dirender di browser lewat FastMarkerCluster
+FAST_CLUSTER_THRESHOLD = 5000
+
+# Callback JS FastMarkerCluster; row = [lat, lon, fill, border, shape, popup_html]
+# divIcon lingkaran/persegi meniru CircleMarker/RegularPolygonMarker pada jalur normal
+_FAST_CLUSTER_CALLBACK = """
+function (row) {
+    var radius = row[4] === 'square' ? '2px' : '50%%';
+    var icon = L.divIcon({
+        className: '',
+        iconSize: [22, 22],
+        html: '<div style="width:16px;height:16px;border-radius:' + radius +
+              ';background:' + row[2] + ';border:3px solid ' + row[3] + ';opacity:0.9;"></div>'
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[5], {maxWidth: %(width)d, maxHeight: %(height)d});
+    return marker;
+}
+"""
+
+# Template HTML popup marker
+_POPUP_HEADER = (
+    "<div style='padding:12px;font-family:Arial, sans-serif;max-width:{max_width}px;'>"
+    "<h4 style='margin:0 0 12px 0;color:#1f2937;border-bottom:2px solid #3b82f6;padding-bottom:6px;'>Detail Informasi</h4>"
+)
+_POPUP_FIELD_PREFIX = (
+    "<div style='margin-bottom:8px;padding:6px;background-color:#f8fafc;border-radius:4px;'>"
+    "<strong style='color:#374151;'>{col}:</strong> "
+    "<span style='color:#1f2937;'>"
+)
+_POPUP_FIELD_SUFFIX = "</span></div>"
+_POPUP_FOOTER = "</div>"
+_POPUP_LINK = '<a href="{href}" target="_blank" style="color:#3b82f6;">Lihat Dokumentasi</a>'
+
+
+class _ResolvedCols(NamedTuple):
+    """Nama kolom yang dipakai make_map (None jika tidak ada di sheet)."""
+    lat: Optional[str]
+    lon: Optional[str]
+    coord: Optional[str]
+    color: Optional[str]        # kolom 'Color' / 'Warna'
+    level: Optional[str]
+    ind_surat: Optional[str]
+    ind_bungkus: Optional[str]
+
+
+def _resolve_cols(df_cols: pd.Index) -> _ResolvedCols:
     """
-    Temukan nama kolom yang mengandung kata 'level' dan 'risiko'/'resiko' (case-insensitive).
+    Resolve semua kolom khusus lewat operasi string vektor pada Index (case-insensitive, ambil yang pertama cocok):
+    - latitude / lat / lintang, longitude / lon / lng / bujur
+    - 'koordinat' / 'coord'
+    - 'color' / 'warna'
+    - 'level' + 'risiko'/'resiko'
+    - 'indikator' + 'surat', 'indikator' + 'bungkus'
     """
-    for c in columns:
-        lc = c.lower()
-        if "level" in lc and ("risiko" in lc or "resiko" in lc):
-            return c
-    return None
+    lower = df_cols.astype(str).str.lower()
 
+    def has(sub: str) -> np.ndarray:
+        return np.asarray(lower.str.contains(sub, regex=False))
 
-def _find_indikator_surat_col(columns: List[str]) -> Optional[str]:
-    """
-    Temukan nama kolom yang mengandung kata 'indikator' dan 'surat' (case-insensitive).
-    """
-    for c in columns:
-        lc = c.lower()
-        if "indikator" in lc and "surat" in lc:
-            return c
-    return None
+    def first(mask: np.ndarray) -> Optional[str]:
+        hits = df_cols[mask]
+        return hits[0] if len(hits) else None
 
+    indikator = has("indikator")
+    return _ResolvedCols(
+        lat=first(np.asarray(lower.isin(("latitude", "lat", "lintang")))),
+        lon=first(np.asarray(lower.isin(("longitude", "lon", "lng", "bujur")))),
+        coord=first(has("koordinat") | has("coord")),
+        color=first(np.asarray(lower.isin(("color", "warna")))),
+        level=first(has("level") & (has("risiko") | has("resiko"))),
+        ind_surat=first(indikator & has("surat")),
+        ind_bungkus=first(indikator & has("bungkus")),
+    )
 
-def _find_indikator_bungkus_col(columns: List[str]) -> Optional[str]:
+
+def _marker_types_from_indikator_surat(values: pd.Series) -> np.ndarray:
     """
-    Temukan nama kolom yang mengandung kata 'indikator' dan 'bungkus' (case-insensitive).
+    Tentukan jenis marker per baris berdasarkan nilai Indikator Surat (vektor)
+    Returns: array 'circle' / 'square'
     """
-    for c in columns:
-        lc = c.lower()
-        if "indikator" in lc and "bungkus" in lc:
-            return c
-    return None
+    norm = values.astype("string").str.strip().str.lower()
+    # persegi untuk Surat Himbauan; lainnya (termasuk Selesai Surat Ke Muspika) lingkaran
+    is_square = norm.str.contains("surat himbauan", regex=False, na=False).to_numpy(dtype=bool)
+    return np.where(is_square, "square", "circle")
 
 
-def _get_color_from_row(row: pd.Series, df_cols: List[str]) -> Optional[str]:
+def _border_colors_from_indikator_bungkus(values: pd.Series) -> np.ndarray:
     """
-    Cek apakah ada kolom 'Color' atau 'Warna' di row, dan kembalikan nilainya jika ada.
+    Tentukan warna border per baris berdasarkan nilai Indikator Bungkus (vektor)
+    Returns: array hex color untuk border
     """
-    color_col = None
-    for c in df_cols:
-        if c.lower() in ("color", "warna"):
-            color_col = c
-            break
-    if color_col:
-        val = row.get(color_col)
-        if pd.notna(val) and str(val).strip() != "":
-            return str(val).strip()
-    return None
-
-
-def _valid_hex(h: Optional[str]) -> bool:
-    """Return True jika h adalah hex color seperti '#aabbcc' atau '#abc'."""
-    if not h:
-        return False
-    if isinstance(h, str) and re.fullmatch(r"^#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})$", h.strip()):
-        return True
-    return False
-
-
-def _parse_coord_from_field(val: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    norm = values.astype("string").str.strip().str.lower()
+    conditions = [
+        norm.str.contains(key, regex=False, na=False).to_numpy(dtype=bool)
+        for key in ("pengiriman usulan", "realisasi pembungkusan", "belum ada tindak lanjut")
+    ]
+    choices = [
+        "#ff6b35",  # orange - untuk usulan/proses awal
+        "#28a745",  # hijau - untuk selesai/realisasi
+        "#dc3545",  # merah - untuk belum ada tindakan
+    ]
+    return np.select(conditions, choices, default="#000000")  # hitam default
+
+
+def _to_float_array(series: pd.Series) -> np.ndarray:
+    """Konversi kolom ke array float64; nilai kosong/tidak valid -> NaN."""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    text = series.astype("string").str.strip()
+    return pd.to_numeric(text, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _blank_mask(series: pd.Series) -> np.ndarray:
+    """True untuk sel kosong/NA/whitespace."""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.isna().to_numpy()
+    text = series.astype("string").str.strip()
+    return (text.isna() | (text == "")).to_numpy(dtype=bool, na_value=True)
+
+
+def _parse_coord_series(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Coba ekstrak dua angka float pertama dari string (seperti 'lat, lon' atau 'lat lon').
-    Return (lat, lon) atau (None, None) kalau gagal.
+    Ekstrak dua angka float pertama dari setiap sel (seperti 'lat, lon' atau 'lat lon').
+    Sel yang gagal -> NaN.
     """
-    if val is None:
-        return None, None
-    if not isinstance(val, str):
-        try:
-            s = str(val)
-        except Exception:
-            return None, None
-    else:
-        s = val
-
-    found = re.findall(FLOAT_RE, s)
-    if len(found) >= 2:
-        try:
-            lat = float(found[0])
-            lon = float(found[1])
-            return lat, lon
-        except Exception:
-            return None, None
-    return None, None
-
-
-def _is_blank(val: Any) -> bool:
-    """True jika val kosong/NA/whitespace."""
-    if val is None:
-        return True
-    try:
-        if pd.isna(val):
-            return True
-    except Exception:
-        pass
-    try:
-        if isinstance(val, str) and val.strip() == "":
-            return True
-    except Exception:
-        pass
-    return False
-
-
-def _get_lat_lon_from_row(row: pd.Series, df_cols: List[str]) -> Tuple[Optional[float], Optional[float]]:
+    n = len(series)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    found = series.reset_index(drop=True).astype("string").str.extractall(FLOAT_RE_C)[0]
+    if found.empty:
+        return lat, lon
+    match_no = found.index.get_level_values("match")
+    first = found[match_no == 0]
+    second = found[match_no == 1]
+    # hanya baris yang punya minimal dua angka
+    rows = second.index.get_level_values(0).to_numpy()
+    lat[rows] = pd.to_numeric(first.droplevel("match").loc[rows], errors="coerce").to_numpy(dtype="float64")
+    lon[rows] = pd.to_numeric(second.droplevel("match"), errors="coerce").to_numpy(dtype="float64")
+    return lat, lon
+
+
+def _extract_lat_lon(df: pd.DataFrame, cols: _ResolvedCols) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Ambil latitude & longitude dari row:
+    Ambil latitude & longitude semua baris sekaligus (array float, NaN jika tidak valid):
     - cek kolom latitude / lat / lintang dan longitude / lon / lng / bujur
-    - jika kosong, coba parse dari kolom 'koordinat' / 'coord'
-    - safe convert ke float
+    - jika salah satunya kosong, coba parse dari kolom 'koordinat' / 'coord'
     """
-    lat = None
-    lon = None
-
-    lat_keys = [c for c in df_cols if c.lower() in ("latitude", "lat", "lintang")]
-    lon_keys = [c for c in df_cols if c.lower() in ("longitude", "lon", "lng", "bujur")]
-
-    if lat_keys:
-        lat = row.get(lat_keys[0])
-    if lon_keys:
-        lon = row.get(lon_keys[0])
-
-    lat_blank = _is_blank(lat)
-    lon_blank = _is_blank(lon)
-
-    if lat_blank or lon_blank:
-        coord_col = None
-        for c in df_cols:
-            if "koordinat" in c.lower() or "coord" in c.lower():
-                coord_col = c
-                break
-        if coord_col:
-            parsed_lat, parsed_lon = _parse_coord_from_field(row.get(coord_col, ""))
-            if parsed_lat is not None and parsed_lon is not None:
-                return parsed_lat, parsed_lon
-
-    # convert jika mungkin
-    lat_f = None
-    lon_f = None
-    try:
-        if not _is_blank(lat) and not pd.isna(lat):
-            lat_f = float(str(lat).strip())
-    except Exception:
-        lat_f = None
+    n = len(df)
+    if cols.lat:
+        lat = _to_float_array(df[cols.lat])
+        lat_blank = _blank_mask(df[cols.lat])
+    else:
+        lat, lat_blank = np.full(n, np.nan), np.ones(n, dtype=bool)
+    if cols.lon:
+        lon = _to_float_array(df[cols.lon])
+        lon_blank = _blank_mask(df[cols.lon])
+    else:
+        lon, lon_blank = np.full(n, np.nan), np.ones(n, dtype=bool)
 
-    try:
-        if not _is_blank(lon) and not pd.isna(lon):
-            lon_f = float(str(lon).strip())
-    except Exception:
-        lon_f = None
+    need_coord = lat_blank | lon_blank
+    if need_coord.any() and cols.coord:
+        parsed_lat, parsed_lon = _parse_coord_series(df[cols.coord])
+        use = need_coord & ~np.isnan(parsed_lat) & ~np.isnan(parsed_lon)
+        lat = np.where(use, parsed_lat, lat)
+        lon = np.where(use, parsed_lon, lon)
 
-    if lat_f is not None and lon_f is not None:
-        return lat_f, lon_f
+    return lat, lon
 
-    # jika hanya lat tersedia
-    if lat_f is not None and lon_f is None:
-        return lat_f, None
 
-    return None, None
+def _valid_coords(lat_arr: np.ndarray, lon_arr: np.ndarray) -> np.ndarray:
+    """True untuk baris yang latitude & longitude-nya terisi."""
+    return ~np.isnan(lat_arr) & ~np.isnan(lon_arr)
 
 
-def _get_marker_type_from_indikator_surat(indikator_value: Optional[str]) -> str:
+def _in_range_coords(lat_arr: np.ndarray, lon_arr: np.ndarray) -> np.ndarray:
     """
-    Tentukan jenis marker berdasarkan nilai Indikator Surat
-    Returns: 'circle' atau 'square'
+    True untuk koordinat dalam rentang (lat -90..90, lon -180..180); NaN otomatis False.
+    Hanya dipakai untuk centroid: marker di luar rentang tetap digambar agar salah input terlihat.
     """
-    if not indikator_value or pd.isna(indikator_value):
-        return 'circle'  # default
+    with np.errstate(invalid="ignore"):
+        return (np.abs(lat_arr) <= 90) & (np.abs(lon_arr) <= 180)
 
-    value_str = str(indikator_value).strip().lower()
 
-    if 'surat himbauan' in value_str:
-        return 'square'  # persegi untuk Surat Himbauan
-    elif 'selesai surat ke muspika' in value_str:
-        return 'circle'  # lingkaran untuk Selesai Surat Ke Muspika
-    else:
-        return 'circle'  # default
+def _hex_mask(text: pd.Series) -> np.ndarray:
+    """True untuk sel berisi hex color valid ('#aabbcc' atau '#abc')."""
+    return text.str.strip().str.fullmatch(HEX_RE_C.pattern).to_numpy(dtype=bool, na_value=False)
 
 
-def _get_border_color_from_indikator_bungkus(indikator_value: Optional[str]) -> str:
+def _fill_colors(df: pd.DataFrame, cols: _ResolvedCols, color_col: str) -> np.ndarray:
     """
-    Tentukan warna border berdasarkan nilai Indikator Bungkus
-    Returns: hex color untuk border
+    Tentukan warna fill semua marker sekaligus. Prioritas:
+    kolom Color/warna -> kolom arg color_col -> derive dari level -> default
     """
-    if not indikator_value or pd.isna(indikator_value):
-        return '#000000'  # hitam default
+    n = len(df)
+    default = "#3388ff"
 
-    value_str = str(indikator_value).strip().lower()
-
-    if 'pengiriman usulan' in value_str:
-        return '#ff6b35'  # orange - untuk usulan/proses awal
-    elif 'realisasi pembungkusan' in value_str:
-        return '#28a745'  # hijau - untuk selesai/realisasi
-    elif 'belum ada tindak lanjut' in value_str:
-        return '#dc3545'  # merah - untuk belum ada tindakan
+    # derive dari level (sama dengan risk_to_color_hex, tapi lewat satu .map)
+    if cols.level:
+        level_norm = df[cols.level].astype("string").str.strip().str.lower()
+        fill = level_norm.map(RISK_TO_HEX).fillna(default).to_numpy(dtype=object)
     else:
-        return '#000000'  # hitam default
+        fill = np.full(n, default, dtype=object)
 
+    if color_col in df.columns:
+        raw = df[color_col].astype("string")
+        fill = np.where(_hex_mask(raw), raw.to_numpy(dtype=object, na_value=None), fill)
 
-def make_map(df: pd.DataFrame,
-             color_col: str = "Color",
-             popup_cols: Optional[List[str]] = None,
-             show_all_columns: bool = True,
-             iframe_width: int = 400,
-             iframe_height: int = 400,
-             show_legend: bool = True) -> Optional[folium.Map]:
+    if cols.color:
+        stripped = df[cols.color].astype("string").str.strip()
+        fill = np.where(_hex_mask(stripped), stripped.to_numpy(dtype=object, na_value=None), fill)
+
+    return fill
+
+
+def _popup_strings(series: pd.Series) -> Tuple[List[str], List[str]]:
     """
-    Bangun peta folium dari DataFrame df.
-    - popup_cols: list kolom eksplisit yang ingin ditampilkan (jika None dan show_all_columns=True -> tampilkan semua)
-    - show_all_columns: jika True -> tampilkan semua kolom yang tidak kosong
-    - iframe_width/iframe_height: ukuran popup dalam pixel
-    - show_legend: jika True -> sisipkan legend overlay ke peta (default True)
+    Ubah satu kolom sekali menjadi (teks ter-strip untuk cek kosong, teks tampilan ter-escape).
+    NA -> "". Nilai yang diawali "http" ditampilkan sebagai link.
+    """
+    na = series.isna().to_numpy()
+    raw = ["" if is_na else str(v) for v, is_na in zip(series.to_numpy(dtype=object), na)]
+    stripped = [v.strip() for v in raw]
+    display = [
+        _POPUP_LINK.format(href=escape(v)) if v.startswith("http") else escape(v, quote=False)
+        for v in raw
+    ]
+    return stripped, display
+
+
+def _iter_marker_specs(df: pd.DataFrame,
+                       cols: _ResolvedCols,
+                       lat_arr: np.ndarray,
+                       lon_arr: np.ndarray,
+                       color_col: str,
+                       popup_cols: Optional[List[str]],
+                       show_all_columns: bool,
+                       iframe_width: int) -> Iterator[Tuple[float, float, str, str, str, str]]:
+    """
+    Hasilkan (lat, lon, fill_color, border_color, marker_type, popup_html) untuk setiap baris
+    dengan koordinat valid. Kolom diambil sekali sebagai array NumPy.
     """
-    if df is None or df.empty:
-        st.info("Tidak ada data untuk dipetakan.")
-        return None
-
     df_cols = df.columns.tolist()
+    col_idx = {c: j for j, c in enumerate(df_cols)}
+    # teks popup per kolom (strip & escape) dihitung sekali, bukan per sel di dalam loop
+    col_texts = [_popup_strings(df[c]) for c in df_cols]
+    col_stripped = [t[0] for t in col_texts]
+    col_display = [t[1] for t in col_texts]
 
-    # Hitung centroid dari titik valid supaya map center lebih relevan
-    lats: List[float] = []
-    lons: List[float] = []
-    for _, row in df.iterrows():
-        lat, lon = _get_lat_lon_from_row(row, df_cols)
-        if lat is not None and lon is not None:
-            lats.append(lat)
-            lons.append(lon)
-
-    if lats and lons:
-        mean_lat = float(pd.Series(lats).mean())
-        mean_lon = float(pd.Series(lons).mean())
+    indikator_surat_col = cols.ind_surat
+    indikator_bungkus_col = cols.ind_bungkus
+
+    fill_arr = _fill_colors(df, cols, color_col)
+
+    # Bentuk marker (Indikator Surat) & warna border (Indikator Bungkus) dihitung sekali untuk semua baris
+    if indikator_surat_col:
+        shape_arr = _marker_types_from_indikator_surat(df[indikator_surat_col])
     else:
-        # fallback coordinate (0,0) jika tidak ada titik valid
-        mean_lat, mean_lon = 0, 0
+        shape_arr = np.full(len(df), "circle")
+    if indikator_bungkus_col:
+        border_arr = _border_colors_from_indikator_bungkus(df[indikator_bungkus_col])
+    else:
+        border_arr = np.full(len(df), "#000000")
 
-    m = folium.Map(location=[mean_lat, mean_lon], zoom_start=12)
+    # Kolom popup eksplisit tidak tergantung baris -> resolve sekali
+    explicit_cols: Optional[List[str]] = None
+    if popup_cols and isinstance(popup_cols, (list, tuple)) and len(popup_cols) > 0:
+        explicit_cols = [c for c in popup_cols if c in col_idx]
+    fallback = [c for c in df_cols if c.lower() in ("alamat", "nama pemilik", "penemu", "koordinat")]
+    fallback_cols = (fallback[:3] + df_cols[:3])[:max(1, min(len(df_cols), 3))]
+
+    # Potongan HTML popup yang konstan (per peta / per kolom) dibangun sekali di luar loop baris
+    popup_header = _POPUP_HEADER.format(max_width=iframe_width - 40)
+    col_prefix = {c: _POPUP_FIELD_PREFIX.format(col=escape(str(c), quote=False)) for c in df_cols}
+
+    # hanya baris dengan koordinat valid (baris lain dilewati tanpa masuk loop Python)
+    for i in np.flatnonzero(_valid_coords(lat_arr, lon_arr)):
+        lat, lon = float(lat_arr[i]), float(lon_arr[i])
 
-    level_col = _find_level_col(df_cols)
-    indikator_surat_col = _find_indikator_surat_col(df_cols)
-    indikator_bungkus_col = _find_indikator_bungkus_col(df_cols)
-
-    for _, row in df.iterrows():
-        lat, lon = _get_lat_lon_from_row(row, df_cols)
-        if lat is None or lon is None:
-            # skip baris tanpa koordinat valid
-            continue
-
-        # Tentukan warna marker: prioritas -> kolom Color/warna -> warna arg color_col -> derive dari level -> default
-        fill_color = _get_color_from_row(row, df_cols)
-        if not _valid_hex(fill_color):
-            if color_col in df_cols:
-                fill_color = row.get(color_col)
-            else:
-                fill_color = None
-
-        if not _valid_hex(fill_color) and level_col:
-            fill_color = risk_to_color_hex(row.get(level_col, ""))
-
-        if not _valid_hex(fill_color):
-            fill_color = "#3388ff"
-
-        # Tentukan bentuk marker berdasarkan Indikator Surat
-        marker_type = 'circle'  # default
-        if indikator_surat_col:
-            indikator_surat_value = row.get(indikator_surat_col)
-            marker_type = _get_marker_type_from_indikator_surat(indikator_surat_value)
-
-        # Tentukan warna border berdasarkan Indikator Bungkus
-        border_color = '#000000'  # default hitam
-        if indikator_bungkus_col:
-            indikator_bungkus_value = row.get(indikator_bungkus_col)
-            border_color = _get_border_color_from_indikator_bungkus(indikator_bungkus_value)
+        fill_color = fill_arr[i]
+        marker_type = str(shape_arr[i])
+        border_color = str(border_arr[i])
+
+        row_stripped = [arr[i] for arr in col_stripped]
 
         # Tentukan kolom yang akan ditampilkan pada popup
-        if popup_cols and isinstance(popup_cols, (list, tuple)) and len(popup_cols) > 0:
+        if explicit_cols is not None:
             # Gunakan kolom yang sudah ditentukan
-            cols_to_show = [c for c in popup_cols if c in df_cols]
+            cols_to_show = explicit_cols
         elif show_all_columns:
             # Tampilkan semua kolom yang ada datanya
-            cols_to_show: List[str] = []
-            for c in df_cols:
-                val = row.get(c, "")
+            cols_to_show = []
+            for c, s in zip(df_cols, row_stripped):
                 # Skip kolom yang kosong atau hanya berisi whitespace
-                if pd.isna(val):
-                    continue
-                s = str(val).strip()
                 if s == "" or s == "0":
                     continue
                 cols_to_show.append(c)
         else:
             # Fallback: tampilkan beberapa kolom pertama yang tidak kosong
             cols_to_show = []
-            for c in df_cols:
+            for c, s in zip(df_cols, row_stripped):
                 if len(cols_to_show) >= 6:
                     break
-                val = row.get(c, "")
-                if pd.isna(val):
-                    continue
-                s = str(val).strip()
                 if s == "":
                     continue
                 cols_to_show.append(c)
 
         # Fallback minimal bila cols_to_show kosong
         if not cols_to_show:
-            fallback = [c for c in df_cols if c.lower() in ("alamat", "nama pemilik", "penemu", "koordinat")]
-            cols_to_show = (fallback[:3] + df_cols[:3])[:max(1, min(len(df_cols), 3))]
+            cols_to_show = fallback_cols
 
-        # Bangun HTML popup dengan styling yang lebih baik
-        popup_html = f"""
-        <div style='padding:12px;font-family:Arial, sans-serif;max-width:{iframe_width-40}px;'>
-            <h4 style='margin:0 0 12px 0;color:#1f2937;border-bottom:2px solid #3b82f6;padding-bottom:6px;'>Detail Informasi</h4>
-        """
+        # Bangun HTML popup dengan styling yang lebih baik (potongan dikumpulkan lalu di-join sekali)
+        parts = [popup_header]
 
         for c in cols_to_show:
-            val = row.get(c, "")
-            if pd.isna(val):
-                val = ""
-            # Safe conversion to string
-            try:
-                s_val = str(val)
-            except Exception:
-                s_val = ""
-
+            j = col_idx[c]
             # Skip jika kosong
-            if s_val.strip() == "" or s_val.strip() == "0":
+            if row_stripped[j] == "" or row_stripped[j] == "0":
                 continue
 
-            # Styling khusus untuk URL/link
-            if s_val.startswith("http"):
-                s_val = f'<a href="{s_val}" target="_blank" style="color:#3b82f6;">Lihat Dokumentasi</a>'
+            # nilai sudah di-escape; URL/link sudah berupa anchor (lihat _popup_strings)
+            parts.append(col_prefix[c])
+            parts.append(col_display[j][i])
+            parts.append(_POPUP_FIELD_SUFFIX)
 
-            popup_html += f"""
-            <div style='margin-bottom:8px;padding:6px;background-color:#f8fafc;border-radius:4px;'>
-                <strong style='color:#374151;'>{c}:</strong>
-                <span style='color:#1f2937;'>{s_val}</span>
-            </div>
-            """
+        parts.append(_POPUP_FOOTER)
+        popup_html = "".join(parts)
 
-        popup_html += "</div>"
+        yield lat, lon, fill_color, border_color, marker_type, popup_html
 
-        # Bungkus HTML ke dalam IFrame agar popup punya ukuran tetap dan scrollable
-        iframe = folium.IFrame(html=popup_html,
-                               width=str(iframe_width),
-                               height=str(iframe_height))
 
-        popup = folium.Popup(iframe, max_width=iframe_width)
+def _add_markers(target: Any,
+                 specs: Iterable[Tuple[float, float, str, str, str, str]],
+                 iframe_width: int,
+                 iframe_height: int) -> None:
+    """
+    Tambahkan marker (lingkaran/persegi + popup) ke `target`
+    (FeatureGroup marker; marker dibuat lalu di-add_child, tanpa .add_to per marker).
+    """
+    for lat, lon, fill_color, border_color, marker_type, popup_html in specs:
+        # Bungkus HTML ke dalam IFrame agar popup punya ukuran tetap dan scrollable.
+        # (tidak di-cache: popup berisi Lat/Lon per baris, jadi isinya hampir tidak pernah sama)
+        iframe = folium.IFrame(html=popup_html, width=str(iframe_width), height=str(iframe_height))
+        popup = folium.Popup(iframe.render(), max_width=iframe_width)
 
         # Pilih jenis marker berdasarkan marker_type dengan border color
         if marker_type == 'square':
             # Gunakan RegularPolygonMarker untuk persegi
-            folium.RegularPolygonMarker(
+            target.add_child(folium.RegularPolygonMarker(
                 location=(lat, lon),
                 number_of_sides=4,  # 4 sisi untuk persegi
                 radius=10,
@@ -371,10 +390,10 @@ def make_map(df: pd.DataFrame,
                 fill_color=fill_color,  # warna fill dari Level Risiko
                 fill_opacity=0.9,
                 popup=popup,
-            ).add_to(m)
+            ))
         else:
             # Default: CircleMarker untuk lingkaran
-            folium.CircleMarker(
+            target.add_child(folium.CircleMarker(
                 location=(lat, lon),
                 radius=8,
                 color=border_color,     # warna border dari Indikator Bungkus
@@ -383,88 +402,204 @@ def make_map(df: pd.DataFrame,
                 fill_color=fill_color, # warna fill dari Level Risiko
                 fill_opacity=0.9,
                 popup=popup,
-            ).add_to(m)
+            ))
 
-    # Tambah legend overlay ke peta (jika diminta)
-    if show_legend:
-        # bangun HTML legend berdasarkan LEVEL_OPTIONS & fungsi warna
-        level_rows = ""
-        for lvl in LEVEL_OPTIONS:
-            hexc = risk_to_color_hex(lvl)
-            level_rows += f"""
-                <div style="display:flex;align-items:center;gap:8px;margin-bottom:6px;">
-                    <div style="width:16px;height:12px;background:{hexc};border-radius:3px;box-shadow:0 0 0 1px rgba(0,0,0,0.06);"></div>
-                    <div style="font-size:13px;color:#111;">{lvl}</div>
-                </div>
-            """
-
-        # contoh indikator surat shapes
-        indikator_shapes_html = """
-            <div style="display:flex;flex-direction:column;gap:6px;margin-top:6px;">
-                <div style="display:flex;align-items:center;gap:8px;">
-                    <svg width="16" height="16"><circle cx="8" cy="8" r="6" fill="#444"/></svg>
-                    <div style="font-size:13px;">Selesai Surat - (lingkaran)</div>
-                </div>
-                <div style="display:flex;align-items:center;gap:8px;">
-                    <svg width="16" height="16" viewBox="0 0 16 16"><polygon points="3,3 13,3 13,13 3,13" fill="#444"/></svg>
-                    <div style="font-size:13px;">Surat Himbauan - (persegi)</div>
-                </div>
+
+def _add_fast_cluster(fmap: folium.Map,
+                      specs: Iterable[Tuple[float, float, str, str, str, str]],
+                      iframe_width: int,
+                      iframe_height: int) -> None:
+    """
+    Jalur sheet besar: semua titik dikirim sebagai satu array data dan marker dibuat di browser
+    (satu objek JS cluster, bukan satu objek per marker). Popup berupa HTML biasa yang bisa di-scroll.
+    """
+    data = [list(spec) for spec in specs]
+    callback = _FAST_CLUSTER_CALLBACK % {"width": iframe_width, "height": iframe_height}
+    FastMarkerCluster(data, callback=callback, name=MARKER_LAYER_NAME).add_to(fmap)
+
+
+def _build_legend_html() -> str:
+    """HTML legend overlay; hanya bergantung pada LEVEL_OPTIONS & fungsi warna, jadi cukup dibangun sekali."""
+    level_rows = ""
+    for lvl in LEVEL_OPTIONS:
+        hexc = risk_to_color_hex(lvl)
+        level_rows += f"""
+            <div style="display:flex;align-items:center;gap:8px;margin-bottom:6px;">
+                <div style="width:16px;height:12px;background:{hexc};border-radius:3px;box-shadow:0 0 0 1px rgba(0,0,0,0.06);"></div>
+                <div style="font-size:13px;color:#111;">{lvl}</div>
             </div>
         """
 
-        # contoh border untuk indikator bungkus (sama dengan function mapping)
-        bungkus_html = """
-            <div style="display:flex;flex-direction:column;gap:6px;margin-top:6px;">
-                <div style="display:flex;align-items:center;gap:8px;">
-                    <div style="width:22px;height:14px;background:#fff;border:3px solid #ff6b35;"></div>
-                    <div style="font-size:13px;">Pengiriman Usulan</div>
-                </div>
-                <div style="display:flex;align-items:center;gap:8px;">
-                    <div style="width:22px;height:14px;background:#fff;border:3px solid #28a745;"></div>
-                    <div style="font-size:13px;">Realisasi Pembungkusan</div>
-                </div>
-                <div style="display:flex;align-items:center;gap:8px;">
-                    <div style="width:22px;height:14px;background:#fff;border:3px solid #dc3545;"></div>
-                    <div style="font-size:13px;">Belum Ada Tindak Lanjut</div>
-                </div>
+    # contoh indikator surat shapes
+    indikator_shapes_html = """
+        <div style="display:flex;flex-direction:column;gap:6px;margin-top:6px;">
+            <div style="display:flex;align-items:center;gap:8px;">
+                <svg width="16" height="16"><circle cx="8" cy="8" r="6" fill="#444"/></svg>
+                <div style="font-size:13px;">Selesai Surat - (lingkaran)</div>
             </div>
-        """
+            <div style="display:flex;align-items:center;gap:8px;">
+                <svg width="16" height="16" viewBox="0 0 16 16"><polygon points="3,3 13,3 13,13 3,13" fill="#444"/></svg>
+                <div style="font-size:13px;">Surat Himbauan - (persegi)</div>
+            </div>
+        </div>
+    """
 
-        legend_html = f"""
-        <div id="map-legend" style="
-            position: absolute;
-            top: 12px;
-            right: 12px;
-            z-index: 9999;
-            background: rgba(255,255,255,0.95);
-            padding: 10px;
-            border-radius: 8px;
-            box-shadow: 0 2px 6px rgba(0,0,0,0.12);
-            font-family: Arial, sans-serif;
-            font-size: 13px;
-            max-width:220px;
-            pointer-events: auto;
-        ">
-            <div style="font-weight:700;margin-bottom:8px;color:#0f172a;">Legenda Peta</div>
-            <div style="font-weight:600;margin-bottom:6px;color:#111;">Level Resiko (isi)</div>
-            {level_rows}
-            <div style="font-weight:600;margin-top:8px;margin-bottom:6px;color:#111;">Indikator Surat (bentuk)</div>
-            {indikator_shapes_html}
-            <div style="font-weight:600;margin-top:8px;margin-bottom:6px;color:#111;">Indikator Bungkus (border)</div>
-            {bungkus_html}
+    # contoh border untuk indikator bungkus (sama dengan function mapping)
+    bungkus_html = """
+        <div style="display:flex;flex-direction:column;gap:6px;margin-top:6px;">
+            <div style="display:flex;align-items:center;gap:8px;">
+                <div style="width:22px;height:14px;background:#fff;border:3px solid #ff6b35;"></div>
+                <div style="font-size:13px;">Pengiriman Usulan</div>
+            </div>
+            <div style="display:flex;align-items:center;gap:8px;">
+                <div style="width:22px;height:14px;background:#fff;border:3px solid #28a745;"></div>
+                <div style="font-size:13px;">Realisasi Pembungkusan</div>
+            </div>
+            <div style="display:flex;align-items:center;gap:8px;">
+                <div style="width:22px;height:14px;background:#fff;border:3px solid #dc3545;"></div>
+                <div style="font-size:13px;">Belum Ada Tindak Lanjut</div>
+            </div>
         </div>
-        """
+    """
+
+    legend_html = f"""
+    <div id="map-legend" style="
+        position: absolute;
+        top: 12px;
+        right: 12px;
+        z-index: 9999;
+        background: rgba(255,255,255,0.95);
+        padding: 10px;
+        border-radius: 8px;
+        box-shadow: 0 2px 6px rgba(0,0,0,0.12);
+        font-family: Arial, sans-serif;
+        font-size: 13px;
+        max-width:220px;
+        pointer-events: auto;
+    ">
+        <div style="font-weight:700;margin-bottom:8px;color:#0f172a;">Legenda Peta</div>
+        <div style="font-weight:600;margin-bottom:6px;color:#111;">Level Resiko (isi)</div>
+        {level_rows}
+        <div style="font-weight:600;margin-top:8px;margin-bottom:6px;color:#111;">Indikator Surat (bentuk)</div>
+        {indikator_shapes_html}
+        <div style="font-weight:600;margin-top:8px;margin-bottom:6px;color:#111;">Indikator Bungkus (border)</div>
+        {bungkus_html}
+    </div>
+    """
+    return legend_html
 
+
+_LEGEND_HTML = _build_legend_html()
+
+
+def make_map(df: pd.DataFrame,
+             color_col: str = "Color",
+             popup_cols: Optional[List[str]] = None,
+             show_all_columns: bool = True,
+             iframe_width: int = 400,
+             iframe_height: int = 400,
+             show_legend: bool = True) -> Optional[folium.Map]:
+    """
+    Bangun peta folium dari DataFrame df.
+    - popup_cols: list kolom eksplisit yang ingin ditampilkan (jika None dan show_all_columns=True -> tampilkan semua)
+    - show_all_columns: jika True -> tampilkan semua kolom yang tidak kosong
+    - iframe_width/iframe_height: ukuran popup dalam pixel
+    - show_legend: jika True -> sisipkan legend overlay ke peta (default True)
+    """
+    if df is None or df.empty:
+        st.info("Tidak ada data untuk dipetakan.")
+        return None
+
+    cols = _resolve_cols(df.columns)
+    lat_arr, lon_arr = _extract_lat_lon(df, cols)
+
+    # Hitung centroid dari titik valid supaya map center lebih relevan (tanpa loop baris)
+    valid = _valid_coords(lat_arr, lon_arr)
+    # titik di luar rentang (mis. lat/lon tertukar) tidak ikut menggeser pusat peta
+    in_range = _in_range_coords(lat_arr, lon_arr)
+    if in_range.any():
+        mean_lat = float(lat_arr[in_range].mean())
+        mean_lon = float(lon_arr[in_range].mean())
+    else:
+        # fallback coordinate (0,0) jika tidak ada titik valid
+        mean_lat, mean_lon = 0, 0
+
+    m = folium.Map(location=[mean_lat, mean_lon], zoom_start=12)
+
+    specs = _iter_marker_specs(df, cols, lat_arr, lon_arr, color_col, popup_cols,
+                               show_all_columns, iframe_width)
+    if int(valid.sum()) > FAST_CLUSTER_THRESHOLD:
+        _add_fast_cluster(m, specs, iframe_width, iframe_height)
+    else:
+        # semua marker masuk satu FeatureGroup yang ditempel ke peta sekali
+        fg = folium.FeatureGroup(name=MARKER_LAYER_NAME)
+        _add_markers(fg, specs, iframe_width, iframe_height)
+        m.add_child(fg)
+
+    # Tambah legend overlay ke peta (jika diminta)
+    if show_legend:
         try:
             # m.get_root() sebenarnya mengembalikan Figure yang memiliki atribut `html`,
             # tetapi Pylance/typing stubs kadang tidak mengenal atribut ini – jadi kita cast ke Any.
             root = m.get_root()
             root_any = cast(Any, root)
-            root_any.html.add_child(Element(legend_html))
+            root_any.html.add_child(Element(_LEGEND_HTML))
         except Exception:
             # jangan crash aplikasi jika penambahan legend gagal; fallback ke sidebar legend
             try:
                 st.warning("Tidak dapat menambahkan legend overlay ke peta (fallback ke sidebar legend).")
             except Exception:
                 pass
-    return m
\ No newline at end of file
+    return m
+
+
+def _save_map_html(cache_path: Path, html: str) -> None:
+    try:
+        MAP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(zlib.compress(html.encode("utf-8"), 6))
+        os.replace(tmp_path, cache_path)
+        # buang file cache paling lama jika melebihi batas
+        old_files = sorted(MAP_CACHE_DIR.glob("*.html.z"), key=lambda p: p.stat().st_mtime)
+        for p in old_files[:-MAP_CACHE_MAX_FILES]:
+            p.unlink(missing_ok=True)
+    except OSError:
+        pass  # cache disk bersifat opsional (mis. filesystem read-only)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def make_map_html(df_hash: str,
+                  _df: pd.DataFrame,
+                  color_col: str = "Color",
+                  popup_cols: Optional[Tuple[str, ...]] = None,
+                  show_all_columns: bool = True,
+                  iframe_width: int = 400,
+                  iframe_height: int = 400,
+                  show_legend: bool = True) -> Optional[str]:
+    """
+    Bangun peta dengan make_map lalu render ke HTML (get_root().render()).
+    Cache dikunci oleh df_hash + parameter + versi renderer (_df tidak di-hash oleh Streamlit),
+    jadi rerun dengan data yang sama langsung memakai HTML yang sudah ada.
+    """
+    params = repr((_MAP_CACHE_SALT, color_col, popup_cols, show_all_columns, iframe_width, iframe_height, show_legend))
+    params_digest = hashlib.blake2b(params.encode("utf-8"), digest_size=4).hexdigest()
+    cache_path = MAP_CACHE_DIR / f"{df_hash}-{params_digest}.html.z"
+    try:
+        return zlib.decompress(cache_path.read_bytes()).decode("utf-8")
+    except (OSError, zlib.error):
+        pass
+
+    fmap = make_map(
+        _df,
+        color_col=color_col,
+        popup_cols=list(popup_cols) if popup_cols else None,
+        show_all_columns=show_all_columns,
+        iframe_width=iframe_width,
+        iframe_height=iframe_height,
+        show_legend=show_legend,
+    )
+    if fmap is None:
+        return None
+    html = fmap.get_root().render()
+    _save_map_html(cache_path, html)
+    return html
@@ -1,30 +1,66 @@
 # sheet_io.py
-import pandas as pd
+import hashlib
+
+import streamlit as st
 from config import SHEET_ID, SHEET_NAME
 
-def read_sheet_values(_gc):
+def _open_worksheet(_gc):
     try:
         sh = _gc.open_by_key(SHEET_ID)
     except Exception as e:
         raise RuntimeError(f"Gagal membuka spreadsheet dengan ID {SHEET_ID}: {e}")
 
     try:
-        ws = sh.worksheet(SHEET_NAME)
+        return sh.worksheet(SHEET_NAME)
     except Exception as e:
         raise RuntimeError(f"Gagal membuka worksheet '{SHEET_NAME}': {e}")
 
-    records = ws.get_all_records()
-    if records:
-        df = pd.DataFrame(records)
-    else:
-        headers = ws.row_values(1)
-        df = pd.DataFrame(columns=headers)
-    return df
+@st.cache_resource(show_spinner=False)
+def _get_worksheet(_gc):
+    """
+    Handle worksheet dipakai ulang antar panggilan (open_by_key + worksheet = dua request API).
+    Gagal membuka tidak di-cache, jadi panggilan berikutnya mencoba lagi.
+    """
+    return _open_worksheet(_gc)
+
+def read_sheet_rows(_gc):
+    """
+    Baca seluruh isi worksheet sebagai list of lists (baris pertama = header).
+    Angka dikirim apa adanya (UNFORMATTED_VALUE) sehingga tidak perlu diparse dari string;
+    tanggal tetap berupa string terformat agar tidak menjadi serial number.
+    """
+    ws = _get_worksheet(_gc)
+    return ws.get_all_values(
+        value_render_option="UNFORMATTED_VALUE",
+        date_time_render_option="FORMATTED_STRING",
+    )
+
+# TTL cache: rerun dalam jendela ini tidak memanggil API Sheets lagi
+SHEET_CACHE_TTL = 60
+
+@st.cache_data(ttl=SHEET_CACHE_TTL, show_spinner=False)
+def fetch_raw_values(_gc):
+    """
+    Satu-satunya pembacaan sheet yang di-cache (dipakai app.py); `_gc` tidak di-hash oleh Streamlit.
+    Return (digest, values): digest dihitung sekali di sini supaya normalisasi tidak perlu meng-hash isi sheet.
+    """
+    values = read_sheet_rows(_gc)
+    raw_digest = hashlib.blake2b(repr(values).encode(), digest_size=8).hexdigest()
+    return raw_digest, values
+
+def append_rows(gc, rows):
+    """
+    Menambahkan beberapa baris sekaligus ke worksheet (satu request API).
+    """
+    if not rows:
+        return
+    ws = _get_worksheet(gc)
+    ws.append_rows(rows, value_input_option="USER_ENTERED")
+    # data di sheet berubah -> buang cache baca yang dipakai app (fetch_raw_values)
+    fetch_raw_values.clear()
 
 def append_row(gc, row_values):
     """
     Menambahkan satu baris ke worksheet.
     """
-    sh = gc.open_by_key(SHEET_ID)
-    ws = sh.worksheet(SHEET_NAME)
-    ws.append_row(row_values, value_input_option="USER_ENTERED")
\ No newline at end of file
+    append_rows(gc, [row_values])
\ No newline at end of file
@@ -0,0 +1,47 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    """Folder kerja dengan secrets.toml sementara (config/forms membaca st.secrets saat import)."""
+    path = tmp_path_factory.mktemp("app")
+    (path / ".streamlit").mkdir()
+    (path / ".streamlit" / "secrets.toml").write_text(
+        'SHEET_ID = "test-sheet"\nMAIN_FOLDER_ID = "test-folder"\n'
+    )
+    return path
+
+
+def _import_in(app_dir, name):
+    old_cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        return importlib.import_module(name)
+    finally:
+        os.chdir(old_cwd)
+
+
+@pytest.fixture(scope="session")
+def forms(app_dir):
+    pytest.importorskip("googleapiclient")
+    pytest.importorskip("google_auth_oauthlib")
+    return _import_in(app_dir, "forms")
+
+
+@pytest.fixture(scope="session")
+def sheet_io(app_dir):
+    return _import_in(app_dir, "sheet_io")
+
+
+@pytest.fixture(scope="session")
+def app(app_dir):
+    pytest.importorskip("gspread")
+    return _import_in(app_dir, "app")
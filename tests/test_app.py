@@ -0,0 +1,20 @@
+import pandas as pd
+
+import map_builder
+
+
+def test_normalize_keeps_full_coordinate_precision(app):
+    df = pd.DataFrame({
+        "Alamat": ["a", "b"],
+        "Latitude": [-7.93813533, "-7,9123456"],
+        "Longitude": [112.6332461, "112.6012345"],
+    })
+    out = app._normalize_df(df)
+
+    assert out["Latitude"].dtype == "float64" and out["Longitude"].dtype == "float64"
+    assert out["Latitude"].tolist() == [-7.93813533, -7.9123456]
+
+    cols = map_builder._resolve_cols(out.columns)
+    lat, lon = map_builder._extract_lat_lon(out, cols)
+    specs = list(map_builder._iter_marker_specs(out, cols, lat, lon, "Color", None, True, 400))
+    assert "-7.93813533" in specs[0][5] and "112.6332461" in specs[0][5]
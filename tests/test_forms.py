@@ -0,0 +1,99 @@
+import pandas as pd
+
+
+def _sheet_df():
+    return pd.DataFrame({
+        "No": pd.Series([1, 2, 3, 4], dtype="int64"),
+        "Alamat": pd.Series(["a", "b", "c", "d"], dtype="string[pyarrow]"),
+        "Latitude": pd.Series([-7.1, -7.2, -7.3, -7.4], dtype="float32"),
+        "Level Resiko": pd.Series(["Low", "High", "Low", "High"], dtype="category"),
+    })
+
+
+def test_append_local_row_keeps_dtypes(forms):
+    df = _sheet_df()
+    out = forms._append_local_row(df, {"No": "5", "Alamat": "e", "Latitude": -7.5, "Level Resiko": "Emergency"})
+
+    assert len(out) == 5
+    assert out.dtypes.to_dict() == {**df.dtypes.to_dict(), "Level Resiko": out["Level Resiko"].dtype}
+    assert out["No"].dtype == "int64"
+    assert isinstance(out["Level Resiko"].dtype, pd.CategoricalDtype)
+    assert out["Level Resiko"].iloc[-1] == "Emergency"
+    # frame asal tidak ikut berubah
+    assert len(df) == 4 and "Emergency" not in df["Level Resiko"].cat.categories
+
+
+def test_next_number_after_append(forms):
+    out = forms._append_local_row(_sheet_df(), {"No": "5", "Alamat": "e"})
+
+    assert forms._get_last_number_from_column(out, "No") == "5 (angka: 5)"
+    assert forms._get_last_number_from_column(_sheet_df(), "No") == "4 (angka: 4)"
+
+
+def test_append_local_row_coerces_values(forms):
+    df = _sheet_df()
+    out = forms._append_local_row(df, {"No": "", "Alamat": None, "Latitude": "bukan angka"})
+
+    # kolom int tetap bilangan bulat (nullable), bukan float 1.0, 2.0, ...
+    assert out["No"].dtype == "Int64"
+    assert out["No"].tolist()[:4] == [1, 2, 3, 4] and pd.isna(out["No"].iloc[-1])
+    assert forms._get_last_number_from_column(out, "No") == "4 (angka: 4)"
+    assert out["Alamat"].dtype == df["Alamat"].dtype and out["Alamat"].iloc[-1] == ""
+    assert out["Latitude"].dtype == "float32" and pd.isna(out["Latitude"].iloc[-1])
+    assert df["No"].dtype == "int64"
+
+
+def test_with_pending_rows_reapplies_queued_rows(forms):
+    st = forms.st
+    try:
+        forms._queue_row([5, "e"], {"No": "5", "Alamat": "e"})
+        forms._queue_row([6, "f"], {"No": "6", "Alamat": "f"})
+        out = forms.with_pending_rows(_sheet_df())
+
+        assert forms.pending_row_count() == 2
+        assert out["Alamat"].tolist()[-2:] == ["e", "f"]
+        assert out["No"].dtype == "int64"
+    finally:
+        for key in (forms.PENDING_ROWS_KEY, forms.PENDING_LOCAL_ROWS_KEY, forms.PENDING_SINCE_KEY):
+            st.session_state.pop(key, None)
+
+    assert len(forms.with_pending_rows(_sheet_df())) == 4
+
+
+def test_thumbnail_applies_exif_orientation(forms):
+    import io
+
+    from PIL import Image
+
+    # landscape 40x20 dengan EXIF Orientation=6 (putar 90°) -> tampil sebagai portrait 20x40
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 20), "red").save(buf, format="JPEG", exif=exif)
+
+    thumb = Image.open(io.BytesIO(forms._make_thumbnail(buf.getvalue())))
+    assert thumb.size == (20, 40)
+
+
+def test_column_cache_follows_data_hash(forms):
+    df = pd.DataFrame({"Indikator Bungkus": ["Belum"], "No": [1]})
+    try:
+        assert forms._merge_options(df, "Indikator Bungkus", (), "h1") == ["Belum"]
+
+        # sel diedit, jumlah baris sama -> digest baru -> opsi ikut diperbarui
+        edited = pd.DataFrame({"Indikator Bungkus": ["Selesai"], "No": [1]})
+        assert forms._merge_options(edited, "Indikator Bungkus", (), "h2") == ["Selesai"]
+    finally:
+        forms.st.session_state.pop(forms.COLUMN_CACHE_KEY, None)
+
+
+def test_form_defaults_follow_data_hash(forms):
+    classes = {"No": "number"}
+    try:
+        df = pd.DataFrame({"No": ["7"]})
+        assert forms._get_form_defaults(df, classes, "h1")["No"] == "7 (angka: 7)"
+
+        edited = pd.DataFrame({"No": ["8"]})
+        assert forms._get_form_defaults(edited, classes, "h2")["No"] == "8 (angka: 8)"
+    finally:
+        forms.st.session_state.pop(forms.FORM_DEFAULTS_KEY, None)
@@ -0,0 +1,103 @@
+import folium
+import pandas as pd
+
+import map_builder
+
+
+def _markers(fmap):
+    for child in fmap._children.values():
+        if isinstance(child, folium.FeatureGroup):
+            yield from _markers(child)
+        elif getattr(child, "location", None):
+            yield child
+
+
+def test_out_of_range_point_drawn_but_not_in_centroid():
+    df = pd.DataFrame({
+        "Latitude": [-7.9, 112.63],  # baris kedua: lat/lon tertukar
+        "Longitude": [112.6, -7.93],
+    })
+    fmap = map_builder.make_map(df)
+
+    assert fmap.location == [-7.9, 112.6]
+    assert len(list(_markers(fmap))) == 2
+
+
+def _specs(df, **kwargs):
+    cols = map_builder._resolve_cols(df.columns)
+    lat, lon = map_builder._extract_lat_lon(df, cols)
+    return list(map_builder._iter_marker_specs(
+        df, cols, lat, lon,
+        kwargs.get("color_col", "Color"),
+        kwargs.get("popup_cols"),
+        kwargs.get("show_all_columns", True),
+        400,
+    ))
+
+
+def test_coordinates_fall_back_to_koordinat_column():
+    df = pd.DataFrame({
+        "Latitude": [-7.1, None, -7.3, None, None],
+        "Longitude": [112.1, None, None, None, None],
+        "Koordinat": ["-1, 1", "-7.2, 112.2", "-7.33 112.33", "-7.4", "bad"],
+    })
+    points = [(lat, lon) for lat, lon, *_ in _specs(df)]
+
+    # kolom lat/lon terisi lengkap -> koordinat diabaikan; salah satu kosong -> parse 'koordinat';
+    # sel dengan < 2 angka atau tanpa angka -> baris dilewati
+    assert points == [(-7.1, 112.1), (-7.2, 112.2), (-7.33, 112.33)]
+
+
+def test_coordinates_from_koordinat_only():
+    df = pd.DataFrame({"Koordinat Lokasi": ["-7.93813533, 112.6332461", ""]})
+    assert [(lat, lon) for lat, lon, *_ in _specs(df)] == [(-7.93813533, 112.6332461)]
+
+
+def test_fill_color_priority():
+    df = pd.DataFrame({
+        "Latitude": [-7.0] * 5,
+        "Longitude": [112.0] * 5,
+        "Level Resiko": [" HIGH ", "Low", "Low", "", "tidak dikenal"],
+        "Color": ["#ff0000", "zzz", " #abc ", None, ""],
+    })
+    fills = [fill for _, _, fill, *_ in _specs(df)]
+
+    # hex valid di kolom Color menang; hex tidak valid -> warna dari level; tanpa keduanya -> default
+    assert fills == ["#ff0000", "#7db86a", "#abc", "#3388ff", "#3388ff"]
+
+
+def test_shape_and_border_mapping():
+    df = pd.DataFrame({
+        "Latitude": [-7.0] * 4,
+        "Longitude": [112.0] * 4,
+        "Indikator Surat": ["Surat Himbauan", "Selesai Surat Ke Muspika", None, " surat HIMBAUAN "],
+        "Indikator Bungkus": [
+            "Pengiriman Usulan Pembungkusan Kabel",
+            "Realisasi pembungkusan",
+            "Belum ada Tindak lanjut Bungkus",
+            "lainnya",
+        ],
+    })
+    specs = _specs(df)
+
+    assert [s[4] for s in specs] == ["square", "circle", "circle", "square"]
+    assert [s[3] for s in specs] == ["#ff6b35", "#28a745", "#dc3545", "#000000"]
+
+
+def test_popup_skips_blank_and_zero_and_escapes():
+    df = pd.DataFrame({
+        "Latitude": [-7.0],
+        "Longitude": [112.0],
+        "Alamat": ["<b>Jl. A & B</b>"],
+        "Kosong": ["  "],
+        "Nol": ["0"],
+        "Dokumentasi": ['https://drive.google.com/uc?id=1&x="y"'],
+        "<Catatan>": ["ok"],
+    })
+    popup = _specs(df)[0][5]
+
+    assert "&lt;b&gt;Jl. A &amp; B&lt;/b&gt;" in popup and "<b>" not in popup
+    assert "Kosong:" not in popup and "Nol:" not in popup
+    assert 'href="https://drive.google.com/uc?id=1&amp;x=&quot;y&quot;"' in popup
+    assert "Lihat Dokumentasi" in popup
+    assert "&lt;Catatan&gt;:" in popup
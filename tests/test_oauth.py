@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+class _ExpiringCreds:
+    """Token masih berlaku beberapa menit lagi, tetapi refresh() selalu gagal."""
+
+    def __init__(self, minutes_left=3):
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=minutes_left)
+        self.refresh_token = "refresh-token"
+        self.refresh_calls = 0
+
+    @property
+    def expired(self):
+        return self.expiry <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @property
+    def valid(self):
+        return not self.expired
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        raise RuntimeError("token endpoint tidak bisa dihubungi")
+
+
+@pytest.fixture
+def no_interactive_flow(forms, monkeypatch):
+    def _fail(*args, **kwargs):
+        raise AssertionError("OAuth flow interaktif tidak boleh dijalankan")
+    monkeypatch.setattr(forms.InstalledAppFlow, "from_client_secrets_file", _fail)
+    monkeypatch.setattr(forms, "_save_creds_merged", lambda path, creds: None)
+
+
+def test_cached_creds_kept_when_early_refresh_fails(forms, monkeypatch, no_interactive_flow):
+    creds = _ExpiringCreds()
+    forms.st.session_state[forms.OAUTH_CREDS_KEY] = creds
+    monkeypatch.setattr(forms, "_load_user_credentials_oauth",
+                        lambda: pytest.fail("token masih berlaku, tidak perlu load ulang"))
+    try:
+        assert forms.get_user_credentials_oauth() is creds
+        assert creds.refresh_calls == 1
+    finally:
+        del forms.st.session_state[forms.OAUTH_CREDS_KEY]
+
+
+def test_loaded_creds_kept_when_early_refresh_fails(forms, monkeypatch, tmp_path, no_interactive_flow):
+    creds = _ExpiringCreds()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / forms.TOKEN_FILE).write_text("{}")
+    monkeypatch.setattr(forms.OAuthCredentials, "from_authorized_user_file",
+                        lambda path, scopes: creds)
+
+    assert forms._load_user_credentials_oauth() is creds
+    assert creds.refresh_calls == 1
@@ -0,0 +1,38 @@
+class _FakeWorksheet:
+    def __init__(self):
+        self.rows = [["No", "Alamat"], [1, "a"]]
+        self.reads = 0
+
+    def get_all_values(self, **kwargs):
+        self.reads += 1
+        return [list(r) for r in self.rows]
+
+    def append_rows(self, rows, value_input_option=None):
+        self.rows.extend(rows)
+
+
+class _FakeClient:
+    def __init__(self):
+        self.ws = _FakeWorksheet()
+
+    def open_by_key(self, key):
+        return self
+
+    def worksheet(self, name):
+        return self.ws
+
+
+def test_append_rows_invalidates_app_read_cache(sheet_io):
+    sheet_io.fetch_raw_values.clear()
+    sheet_io._get_worksheet.clear()
+    gc = _FakeClient()
+
+    _, before = sheet_io.fetch_raw_values(gc)
+    sheet_io.fetch_raw_values(gc)
+    assert gc.ws.reads == 1  # rerun kedua memakai cache
+
+    sheet_io.append_rows(gc, [[2, "b"]])
+    _, after = sheet_io.fetch_raw_values(gc)
+
+    assert gc.ws.reads == 2
+    assert after[-1] == [2, "b"] and len(after) == len(before) + 1
@@ -32,5 +32,9 @@ def risk_to_color_hex(risk_value: str, default: str = "#3388ff") -> str:
 
 def convert_image_to_base64(uploaded_file):
     """Mengonversi file upload (image) menjadi base64 string."""
-    img_bytes = uploaded_file.read()
-    return base64.b64encode(img_bytes).decode()
\ No newline at end of file
+    # UploadedFile/BytesIO: getbuffer() = memoryview tanpa salin; selain itu baca biasa
+    if hasattr(uploaded_file, "getbuffer"):
+        img_bytes = uploaded_file.getbuffer()
+    else:
+        img_bytes = uploaded_file.read()
+    return base64.b64encode(img_bytes).decode("ascii")